@@ -0,0 +1,326 @@
+"""Benchmarks the state loop on a synthetic project.
+
+Builds a ProgramState with N tracks of M clips, each clip having K
+automated inputs that drive groups of DmxOutputGroup outputs, and runs
+ProgramState.update() as fast as possible while an Ethernet DMX output
+sends to a local UDP sink.
+
+Reports ticks/sec, per-tick latency percentiles and allocations, and
+saves the results so that revisions can be compared:
+
+    python benchmark.py --output before.json
+    python benchmark.py --compare before.json
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+import model
+
+NS_PER_MS = 1_000_000
+
+
+class UdpSink:
+    """Receives and counts the packets sent to it."""
+
+    def __init__(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.socket.settimeout(0.1)
+        self.port = self.socket.getsockname()[1]
+        self.packets = 0
+        self.bytes = 0
+        self.done = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.done = True
+        self.thread.join()
+        self.socket.close()
+
+    def _run(self):
+        while not self.done:
+            try:
+                data = self.socket.recv(2048)
+            except socket.timeout:
+                continue
+            self.packets += 1
+            self.bytes += len(data)
+
+
+def build_state(
+    project_folder_path, port, n_tracks, n_clips, n_inputs, n_groups, group_size
+):
+    """Return a playing ProgramState with every clip started.
+
+    Each track sends on its own universe. Every clip drives all of the
+    output groups of its track from its inputs.
+    """
+    state = model.ProgramState()
+    state.project_folder_path = project_folder_path
+    os.makedirs(os.path.join(project_folder_path, "code"), exist_ok=True)
+
+    while len(state.tracks) - 1 < n_tracks:
+        state.tracks.insert(-1, model.Track(f"Track {len(state.tracks) - 1}"))
+
+    if n_groups * group_size > 512:
+        raise ValueError("The output groups of a track do not fit in a universe")
+
+    channel_names = [f"c{i}" for i in range(group_size)]
+    rng = np.random.default_rng(0)
+
+    for universe, track in enumerate(state.tracks[:n_tracks]):
+        groups = [
+            track.create_output_group(
+                1 + g * group_size, channel_names, f"Pixels{g}", universe
+            )
+            for g in range(n_groups)
+        ]
+
+        for clip_i in range(n_clips):
+            clip = state.execute(f"new_clip {track.id},{clip_i}").payload
+            inputs = []
+            for _ in range(n_inputs):
+                input_channel = clip.create_source("int")
+                input_channel.get_parameter("max").value = 255
+                automation = input_channel.add_automation()
+                for x in np.sort(rng.uniform(0, automation.length, 6)):
+                    automation.add_point(model.Point(float(x), int(rng.integers(256))))
+                inputs.append(input_channel)
+
+            lines = []
+            for g, group in enumerate(groups):
+                for c, channel_name in enumerate(channel_names):
+                    input_channel = inputs[(g * group_size + c) % n_inputs]
+                    lines.append(
+                        f"{group.name}.{channel_name}.value = {input_channel.name}.value"
+                    )
+            clip.main_code.save("\n".join(lines) + "\n")
+            clip.start()
+
+    state.execute(f"create_io 0 outputs ethernet_dmx 127.0.0.1:{port}")
+    state.start()
+    return state
+
+
+def percentiles_ms(durations_ns):
+    durations = np.array(durations_ns, dtype=float) / NS_PER_MS
+    p50, p90, p99 = np.percentile(durations, [50, 90, 99])
+    return {
+        "mean": durations.mean(),
+        "p50": p50,
+        "p90": p90,
+        "p99": p99,
+        "max": durations.max(),
+    }
+
+
+def run(state, n_ticks, n_warmup):
+    for _ in range(n_warmup):
+        state.update()
+    state.profiler.reset()
+
+    # Timing pass
+    durations = []
+    gc_collections = sum(stat["collections"] for stat in gc.get_stats())
+    blocks = sys.getallocatedblocks()
+    t_start = time.perf_counter_ns()
+    for _ in range(n_ticks):
+        t0 = time.perf_counter_ns()
+        state.update()
+        durations.append(time.perf_counter_ns() - t0)
+    elapsed_ns = time.perf_counter_ns() - t_start
+    blocks = sys.getallocatedblocks() - blocks
+    gc_collections = sum(stat["collections"] for stat in gc.get_stats()) - gc_collections
+    profile = state.profiler.summary()
+
+    # Allocation pass, tracemalloc slows the ticks down so it is not timed.
+    tick_allocations = []
+    tracemalloc.start()
+    for _ in range(min(n_ticks, 200)):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        state.update()
+        _, peak = tracemalloc.get_traced_memory()
+        tick_allocations.append(peak - current)
+    tracemalloc.stop()
+
+    return {
+        "ticks": n_ticks,
+        "ticks_per_s": n_ticks / (elapsed_ns / 1e9),
+        "tick_ms": percentiles_ms(durations),
+        "allocations": {
+            "peak_bytes_per_tick_p50": float(np.median(tick_allocations)),
+            "peak_bytes_per_tick_max": int(max(tick_allocations)),
+            "net_blocks_per_tick": blocks / n_ticks,
+            "gc_collections_per_1000_ticks": gc_collections * 1000 / n_ticks,
+        },
+        "profile": profile,
+    }
+
+
+def git_revision():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except Exception:
+        return "unknown"
+
+
+def section_p50_ms(profile, prefix):
+    """Return the sum of the p50 of the profiled sections starting with prefix."""
+    return sum(
+        stat.get("p50_ms", 0)
+        for name, stat in profile.items()
+        if name.startswith(prefix)
+    )
+
+
+def print_results(results, baseline=None):
+    def line(name, value, baseline_value, unit, lower_is_better=True):
+        text = f"{name:<34}{value:>12.4f} {unit}"
+        if baseline_value:
+            change = (value - baseline_value) / baseline_value * 100
+            better = change < 0 if lower_is_better else change > 0
+            text += f"  ({change:+.1f}% {'better' if better else 'worse'})"
+        print(text)
+
+    base = baseline["results"] if baseline else {}
+    print(f"Revision {results['revision']}, {results['params']}")
+    line(
+        "ticks/sec",
+        results["results"]["ticks_per_s"],
+        base.get("ticks_per_s"),
+        "",
+        lower_is_better=False,
+    )
+    for key, value in results["results"]["tick_ms"].items():
+        line(f"tick {key}", value, base.get("tick_ms", {}).get(key), "ms")
+    for key, value in results["results"]["allocations"].items():
+        line(key, value, base.get("allocations", {}).get(key), "")
+    # The automations are evaluated in their own section, the inputs are
+    # then updated in the track sections along with the clip code.
+    profile = results["results"]["profile"]
+    base_profile = base.get("profile", {})
+    for name, prefix in [("automations p50", "automations"), ("tracks p50", "track.")]:
+        line(
+            name,
+            section_p50_ms(profile, prefix),
+            section_p50_ms(base_profile, prefix),
+            "ms",
+        )
+    print(
+        f"{'packets received':<34}{results['sink']['packets']:>12}"
+        f" ({results['sink']['bytes']} bytes)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CodeDMX state loop benchmark")
+    parser.add_argument("--tracks", default=6, type=int, dest="n_tracks")
+    parser.add_argument("--clips", default=4, type=int, dest="n_clips")
+    parser.add_argument("--inputs", default=8, type=int, dest="n_inputs")
+    parser.add_argument("--groups", default=4, type=int, dest="n_groups")
+    parser.add_argument("--group-size", default=16, type=int, dest="group_size")
+    parser.add_argument("--ticks", default=2000, type=int, dest="n_ticks")
+    parser.add_argument("--warmup", default=100, type=int, dest="n_warmup")
+    parser.add_argument(
+        "--sync-outputs",
+        default=False,
+        action="store_true",
+        help="Send the outputs from the state loop instead of output threads.",
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        dest="output_path",
+        help="Results file. Defaults to benchmarks/<time>-<revision>.json",
+    )
+    parser.add_argument(
+        "--compare",
+        default=None,
+        dest="baseline_path",
+        help="Results file of a previous run to compare against.",
+    )
+    args = parser.parse_args()
+
+    params = {
+        "tracks": args.n_tracks,
+        "clips": args.n_clips,
+        "inputs": args.n_inputs,
+        "groups": args.n_groups,
+        "group_size": args.group_size,
+        "sync_outputs": args.sync_outputs,
+    }
+
+    sink = UdpSink()
+    sink.start()
+    with tempfile.TemporaryDirectory() as project_folder_path:
+        state = build_state(
+            project_folder_path,
+            sink.port,
+            args.n_tracks,
+            args.n_clips,
+            args.n_inputs,
+            args.n_groups,
+            args.group_size,
+        )
+        state.async_outputs = not args.sync_outputs
+        results = run(state, args.n_ticks, args.n_warmup)
+        state.stop_output_threads()
+    time.sleep(0.2)
+    sink.stop()
+
+    revision = git_revision()
+    data = {
+        "revision": revision,
+        "time": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": params,
+        "results": results,
+        "sink": {"packets": sink.packets, "bytes": sink.bytes},
+    }
+
+    baseline = None
+    if args.baseline_path:
+        with open(args.baseline_path, "r") as f:
+            baseline = json.load(f)
+        if baseline["params"] != params:
+            print(f"Warning: baseline parameters differ: {baseline['params']}")
+    print_results(data, baseline)
+
+    output_path = args.output_path
+    if output_path is None:
+        output_path = os.path.join(
+            "benchmarks", f"{time.strftime('%Y%m%d-%H%M%S')}-{revision}.json"
+        )
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(data, f, indent=4)
+    print(f"Saved {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Compiled clip code, cached in memory and on disk.
+
+Clips reload their code every time they start, e.g. whenever a sequence
+switches clips. Compiling is only done when the source changed: a file
+whose modification time and size did not change is not even read, and a
+file whose content hash did not change is not compiled again.
+
+Compiled code is also written next to the code, in code/__pycache__, so
+opening a project does not compile every clip again.
+"""
+import hashlib
+import importlib.util
+import logging
+import marshal
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+CACHE_FOLDER = "__pycache__"
+
+# Compiled code from another Python version can not be loaded.
+MAGIC = importlib.util.MAGIC_NUMBER
+
+
+class _Entry:
+    def __init__(self, stat, digest, code):
+        self.mtime_ns = stat.st_mtime_ns
+        self.size = stat.st_size
+        self.digest = digest
+        self.code = code
+
+
+class CodeCache:
+    """Compiles source files to code objects, only when they change."""
+
+    def __init__(self):
+        # file path -> _Entry
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.compiled = 0
+        self.loaded = 0
+        self.hits = 0
+
+    def compile(self, file_path_name, persist=True):
+        """Return the code object of a source file.
+
+        file_path_name (str): Path of the source file.
+        persist (bool): Whether the compiled code is kept on disk next to
+                        the source file.
+        """
+        stat = os.stat(file_path_name)
+        with self._lock:
+            entry = self._entries.get(file_path_name)
+        if (
+            entry is not None
+            and entry.mtime_ns == stat.st_mtime_ns
+            and entry.size == stat.st_size
+        ):
+            self.hits += 1
+            return entry.code
+
+        with open(file_path_name, "rb") as f:
+            source = f.read()
+        digest = hashlib.sha256(file_path_name.encode() + b"\0" + source).hexdigest()
+
+        if entry is not None and entry.digest == digest:
+            # Saved again without changes.
+            self.hits += 1
+            code = entry.code
+        else:
+            code = self._load(file_path_name, digest) if persist else None
+            if code is not None:
+                self.loaded += 1
+            else:
+                code = compile(source, file_path_name, "exec")
+                self.compiled += 1
+                if persist:
+                    self._dump(file_path_name, digest, code)
+
+        with self._lock:
+            self._entries[file_path_name] = _Entry(stat, digest, code)
+        return code
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+    def _cache_path(self, file_path_name, digest):
+        folder, file_name = os.path.split(file_path_name)
+        return os.path.join(folder, CACHE_FOLDER, f"{file_name}.{digest[:16]}.pyc")
+
+    def _load(self, file_path_name, digest):
+        path = self._cache_path(file_path_name, digest)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        header = MAGIC + bytes.fromhex(digest)
+        if not data.startswith(header):
+            return None
+        try:
+            return marshal.loads(data[len(header) :])
+        except (EOFError, ValueError, TypeError) as e:
+            logger.debug("Invalid cached code %s: %s", path, e)
+            return None
+
+    def _dump(self, file_path_name, digest, code):
+        path = self._cache_path(file_path_name, digest)
+        folder = os.path.dirname(path)
+        prefix = os.path.basename(file_path_name) + "."
+        try:
+            os.makedirs(folder, exist_ok=True)
+            # Only the code of the current source is kept.
+            for name in os.listdir(folder):
+                if name.startswith(prefix) and name.endswith(".pyc"):
+                    os.remove(os.path.join(folder, name))
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as f:
+                f.write(MAGIC + bytes.fromhex(digest) + marshal.dumps(code))
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning("Failed to cache the code of %s: %s", file_path_name, e)
@@ -6,6 +6,7 @@ from threading import RLock, Thread
 import model
 import gui
 import fixtures
+import dmxio
 
 import numpy as np
 import os
@@ -18,6 +19,7 @@ import subprocess
 import sys
 import logging
 import util
+import scheduler
 
 logging.basicConfig(
     filename="log.txt",
@@ -90,13 +92,18 @@ def get_channel_preset_theme(preset):
 class Application:
     """Runs the main dpg loop and state updates."""
 
-    def __init__(self, debug):
+    def __init__(self, debug, tick_rate=scheduler.DEFAULT_TICK_RATE):
         # Debug flag.
         self.debug = debug
 
         # Model and state logic
         self.state = model.ProgramState()
 
+        # Runs the state updates at a fixed rate.
+        self.scheduler = scheduler.TickScheduler(tick_rate)
+        # Set when the GUI is closed, stops the state loop.
+        self.done = False
+
         # State of GUI elements.
         # TODO: Move to IOWindow
         self.gui_state = {
@@ -151,6 +158,7 @@ class Application:
         self._properties_buffer = defaultdict(dict)
 
         self._tap_tempo_buffer = [0, 0, 0, 0, 0]
+        self._sync_sources = None
         self._quantize_amount = None
 
         self.ctrl = False
@@ -345,17 +353,14 @@ class Application:
             logger.warning(traceback.format_exc())
             logger.warning(e)
             raise e
+        finally:
+            # Stop the state loop first, it would start the output threads again.
+            self.done = True
+            thread.join(1.0)
+            self.state.stop_output_threads()
 
     def state_loop(self):
-        # Runs at 60 Hz
-        period = 1.0 / 60.0
-        while True:
-            t_start = time.time()
-            self.state.update()
-            t_end = time.time()
-            delta_t = t_end - t_start
-            if delta_t < period:
-                time.sleep(period - delta_t)
+        self.scheduler.run(self.state.update, lambda: self.done)
 
     def gui_lock(func):
         """Return a wrapper that will grab the GUI lock."""
@@ -471,7 +476,7 @@ class Application:
                 f"duplicate_clip_preset {clip.id} {preset.id}"
             )
             if not result.success:
-                self.state.log.append("Failed to duplicate clip")
+                self.state.log.warning("Failed to duplicate clip")
 
         with dpg.menu(
             parent=preset_menu_tag,
@@ -1329,6 +1334,14 @@ class Application:
             "play_button",
             label="[Playing]" if self.state.playing else "[Paused]",
         )
+
+        sync_sources = ["Internal"] + list(model.MIDI_INPUT_DEVICES)
+        if sync_sources != self._sync_sources:
+            self._sync_sources = sync_sources
+            dpg.configure_item("sync_source", items=sync_sources)
+        if self.state.sync_source is not None:
+            # The tempo follows the sync source.
+            dpg.set_value("tempo", round(self.state.tempo, 2))
         if self.state.playing:
             g = 0.90 * gui.PLAY_BUTTON_COLOR[1]
             g = max(10, int(g))
@@ -1634,6 +1647,11 @@ class Application:
                 callback=self.add_input_channel_callback,
                 user_data=("create", (clip, "osc_input_float"), right_click_menu),
             )
+            dpg.add_menu_item(
+                label="Osc Array...",
+                callback=self.create_and_show_osc_array_window_callback,
+                user_data=clip,
+            )
             dpg.add_menu_item(
                 label="MIDI",
                 callback=self.add_input_channel_callback,
@@ -1834,6 +1852,17 @@ class Application:
                 callback=self.update_channel_attr_callback,
                 user_data=(output_channel, "dmx_address"),
             )
+            dpg.add_input_int(
+                tag=f"{output_channel.id}.universe",
+                width=75,
+                default_value=output_channel.universe,
+                min_value=0,
+                max_value=dmxio.MAX_UNIVERSE,
+                min_clamped=True,
+                max_clamped=True,
+                callback=self.update_channel_attr_callback,
+                user_data=(output_channel, "universe"),
+            )
             dpg.add_input_text(
                 tag=f"{output_channel.id}.name",
                 default_value=output_channel.name,
@@ -1878,6 +1907,10 @@ class Application:
             output_channel_group = user_data
             output_channel_group.update_starting_address(app_data)
 
+        def update_channel_group_universe(sender, app_data, user_data):
+            output_channel_group = user_data
+            output_channel_group.update_universe(app_data)
+
         def update_channel_group_name(sender, app_data, user_data):
             output_channel_group = user_data
             output_channel_group.update_name(app_data)
@@ -1892,6 +1925,17 @@ class Application:
                 callback=update_channel_group_address,
                 user_data=output_channel_group,
             )
+            dpg.add_input_int(
+                tag=f"{output_channel_group.id}.universe",
+                width=75,
+                default_value=output_channel_group.universe,
+                min_value=0,
+                max_value=dmxio.MAX_UNIVERSE,
+                min_clamped=True,
+                max_clamped=True,
+                callback=update_channel_group_universe,
+                user_data=output_channel_group,
+            )
             dpg.add_input_text(
                 tag=f"{output_channel_group.id}.name",
                 default_value=output_channel_group.name,
@@ -2092,6 +2136,18 @@ class Application:
                 tag="tempo",
                 step=0,
             )
+
+            def update_sync_source(sender, app_data):
+                device_name = "" if app_data == "Internal" else app_data
+                self.state.execute(f"set_sync_source {device_name}")
+
+            dpg.add_combo(
+                items=["Internal"],
+                default_value=self.state.sync_source or "Internal",
+                callback=update_sync_source,
+                width=80,
+                tag="sync_source",
+            )
             add_separator()
 
             dpg.add_button(
@@ -2284,7 +2340,7 @@ class Application:
         obj.get_parameter(parameter_name).value = value
 
     def reset_time_callback(self):
-        self.state.play_time_start_s = time.time() - HUMAN_DELAY
+        self.state.play_time_start_s = time.perf_counter() - HUMAN_DELAY
 
     def tap_tempo_callback(self):
         self._tap_tempo_buffer.insert(0, time.time())
@@ -2486,7 +2542,12 @@ class Application:
                                 input_midi_device_name
                             ):
                                 output_device.map_channel(
-                                    message.channel, note_control, obj
+                                    message.channel,
+                                    note_control,
+                                    obj,
+                                    "control_change"
+                                    if message.type == "control_change"
+                                    else "note_on",
                                 )
                                 logger.debug(
                                     f"Mapping {(message.channel, note_control)} to {output_device.device_name}"
@@ -2514,6 +2575,70 @@ class Application:
                 dpg.add_button(label="Save", callback=save, user_data=obj)
                 dpg.add_button(label="Cancel", callback=cancel, user_data=obj)
 
+    def create_and_show_osc_array_window_callback(self, sender, app_data, user_data):
+        """Map the OSC inputs of a clip, in order, to an address pattern."""
+        clip = user_data
+        try:
+            dpg.delete_item("osc_array_window")
+        except:
+            pass
+
+        def osc_inputs():
+            return [
+                input_channel
+                for input_channel in clip.inputs
+                if isinstance(input_channel, model.OscInput)
+                and not input_channel.deleted
+            ]
+
+        def cancel(sender, app_data, user_data):
+            dpg.delete_item("osc_array_window")
+
+        def save(sender, app_data, user_data):
+            pattern = dpg.get_value("osc_array_window.pattern").strip()
+            start = dpg.get_value("osc_array_window.start")
+            input_ids = ",".join(input_channel.id for input_channel in osc_inputs())
+            if not pattern or " " in pattern or not input_ids:
+                return
+            result = self.execute_wrapper(
+                f"map_osc_array {pattern} {start} {input_ids}"
+            )
+            if result.success:
+                dpg.delete_item("osc_array_window")
+            else:
+                logger.warning(f"Failed to map {pattern}")
+
+        def unmap(sender, app_data, user_data):
+            pattern = dpg.get_value("osc_array_window.pattern").strip()
+            if pattern:
+                self.execute_wrapper(f"unmap_osc_array {pattern}")
+            dpg.delete_item("osc_array_window")
+
+        with dpg.window(
+            tag="osc_array_window",
+            modal=True,
+            width=300,
+            height=300,
+            no_move=True,
+            no_title_bar=True,
+        ):
+            dpg.add_text(f"Map the {len(osc_inputs())} OSC inputs of {clip.name}")
+            dpg.add_input_text(
+                tag="osc_array_window.pattern",
+                label="Pattern",
+                default_value="/fader/*",
+                no_spaces=True,
+            )
+            dpg.add_input_int(
+                tag="osc_array_window.start",
+                label="First number",
+                default_value=1,
+            )
+            with dpg.group(horizontal=True):
+                dpg.add_button(label="Save", callback=save)
+                dpg.add_button(label="Unmap", callback=unmap)
+                dpg.add_button(label="Cancel", callback=cancel)
+
     def open_menu_callback(self):
         dpg.configure_item("open_file_dialog", show=True)
 
@@ -2878,9 +3003,24 @@ if __name__ == "__main__":
         "--debug", default=True, dest="debug", help="Enable debug mode."
     )
 
+    parser.add_argument(
+        "--rate",
+        default=scheduler.DEFAULT_TICK_RATE,
+        type=float,
+        dest="tick_rate",
+        help="State updates per second.",
+    )
+
+    parser.add_argument(
+        "--profile-output",
+        default=None,
+        dest="profile_output_path",
+        help="File the state loop timings are written to on exit.",
+    )
+
     args = parser.parse_args()
 
-    app = Application(args.debug)
+    app = Application(args.debug, args.tick_rate)
     gui.set_app(app)
 
     cache = {"recent": []}
@@ -2908,4 +3048,7 @@ if __name__ == "__main__":
     else:
         app.run()
 
+    if args.profile_output_path:
+        app.state.profiler.dump(args.profile_output_path)
+
     logging.info("Exiting.")
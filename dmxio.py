@@ -3,9 +3,25 @@ import struct
 
 import time
 import threading
+import uuid
 
 DMX_SIZE = 512
 
+BLACKOUT = bytes(DMX_SIZE)
+
+# Art-Net Port-Address is 15 bits (Net, Sub-Net and Universe).
+MAX_UNIVERSE = 0x7FFF
+
+# Unchanged frames are still resent this often (seconds) so receivers don't
+# time out. Art-Net recommends 4 s but many nodes expect a frame every second.
+DEFAULT_KEEP_ALIVE = 1.0
+
+# See ANSI E1.31 (Streaming ACN).
+SACN_PORT = 5568
+SACN_MAX_UNIVERSE = 63999
+SACN_DEFAULT_PRIORITY = 100
+SACN_MAX_PRIORITY = 200
+
 
 class DmxConnection(object):
     """Sends DMX messages over the network."""
@@ -27,44 +43,86 @@ class DmxConnection(object):
         b"\x00",
         b"\x00",
         b"\x00",
-        b"\x00",  # Universe 0 (Only supportes 1 universe)
+        b"\x00",  # Universe, replaced for each packet
         b"\x02",
         b"\x00",
     )  # 512 Channels
 
     HEADER_BYTES = struct.pack("c" * len(HEADER), *HEADER)
 
-    def __init__(self, address):
+    # Offset of the little-endian universe in the header.
+    UNIVERSE_OFFSET = 14
+
+    # ArtSync: ID, OpCode 0x5200, version 14 and two zero Aux bytes.
+    SYNC_BYTES = b"Art-Net\x00" + struct.pack("<H", 0x5200) + b"\x00\x0e\x00\x00"
+
+    def __init__(self, address, keep_alive=DEFAULT_KEEP_ALIVE, sync=False):
         """Constructor.
 
         address (tuple): Host and port. Example: ("localhost", 8000).
+        keep_alive (float): Seconds after which an unchanged frame is resent.
+        sync (bool): Whether render_universes() follows the frames with a sync
+                     packet so that receivers output them at the same time.
         """
-        self._dmx_frame = [0] * DMX_SIZE
+        self.keep_alive = keep_alive
+        self.sync = sync
+        # Preallocated packet (header + frame) and a view of its frame, for each universe.
+        self._packets = {}
+        self._dmx_frames = {}
+        # Last frame sent and when, for each universe.
+        self._sent_frames = {}
+        self._sent_times = {}
         self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._address = address
         self._connected = True
-
-    def set_channel(self, channel, value, autorender=False):
+        self._frame(0)
+
+    def _frame(self, universe):
+        dmx_frame = self._dmx_frames.get(universe)
+        if dmx_frame is None:
+            if not 0 <= universe <= MAX_UNIVERSE:
+                raise RuntimeError(f"Invalid universe {universe}")
+            packet = self._make_packet(universe)
+            dmx_frame = memoryview(packet)[len(packet) - DMX_SIZE :]
+            self._packets[universe] = packet
+            self._dmx_frames[universe] = dmx_frame
+        return dmx_frame
+
+    def _make_packet(self, universe):
+        """Return a new packet for a universe. The DMX frame is its last DMX_SIZE bytes."""
+        packet = bytearray(self.HEADER_BYTES + BLACKOUT)
+        struct.pack_into("<H", packet, self.UNIVERSE_OFFSET, universe)
+        return packet
+
+    def _send(self, universe):
+        self._socket.sendto(self._packets[universe], self._address)
+
+    def _send_sync(self):
+        self._socket.sendto(self.SYNC_BYTES, self._address)
+
+    def set_channel(self, channel, value, autorender=False, universe=0):
         """Sets the desired DMX channel givan a value.
 
         channel (int): The channel to set.
         value (int): The value to set the channel [0, 255].
         autorender (bool): Whether to send the DMX message immediately.
+        universe (int): The universe of the channel.
         """
-        if not 1 <= chan <= DMX_SIZE:
+        if not 1 <= channel <= DMX_SIZE:
             raise RuntimeError(f"Invalid DMX channel {channel}")
         if not 0 <= value < 256:
             raise RuntimeError(f"Invalid DMX value {value}")
 
-        self._dmx_frame[channel - 1] = value
+        self._frame(universe)[channel - 1] = value
         if autorender:
-            self.render()
+            self.render(universe)
 
-    def set_channels(self, start_channel, values):
+    def set_channels(self, start_channel, values, universe=0):
         """Sets multiple DMX channels.
 
         start_channel (int): The initial DMX channel to set.
         values (list): The list of values
+        universe (int): The universe of the channels.
         """
         if not (
             (1 <= start_channel <= DMX_SIZE)
@@ -72,33 +130,254 @@ class DmxConnection(object):
         ):
             raise RuntimeError(f"Invalid indices: {start_channel}")
         start_channel = start_channel - 1
-        self._dmx_frame[start_channel : start_channel + len(values)] = values
+        self._frame(universe)[start_channel : start_channel + len(values)] = bytes(
+            values
+        )
+
+    def get_dmx_buffer(self, universe=0):
+        """Return a writable memoryview of the DMX frame of a universe.
+
+        Index 0 is DMX channel 1. The view is part of the packet sent by
+        render(), so writing to it is all that is needed to update the output.
+        """
+        return self._frame(universe)
 
     def clear(self):
-        """Clears all channels to zero. blackout."""
-        self._dmx_frame = [0] * DMX_SIZE
+        """Clears all channels of every universe to zero. blackout."""
+        for dmx_frame in self._dmx_frames.values():
+            dmx_frame[:] = BLACKOUT
+
+    def render(self, universe=0, changed_only=False):
+        """Sends the DMX message of a universe over the network to update the DMX output.
+
+        universe (int): The universe to send.
+        changed_only (bool): Only send the frame if it changed since it was last
+                             sent or if keep_alive seconds have passed.
+
+        Returns whether the frame was sent.
+        """
+        dmx_frame = self._frame(universe)
+        sent_frame = self._sent_frames.get(universe)
+        now = time.monotonic()
+        if (
+            changed_only
+            and sent_frame is not None
+            and dmx_frame == sent_frame
+            and now - self._sent_times[universe] < self.keep_alive
+        ):
+            return False
 
-    def render(self):
-        """Sends the DMX message over the network to update the DMX output."""
         try:
-            self._socket.sendto(
-                self.HEADER_BYTES + bytes(self._dmx_frame), self._address
-            )
+            self._send(universe)
+            if sent_frame is None:
+                self._sent_frames[universe] = bytearray(dmx_frame)
+            else:
+                sent_frame[:] = dmx_frame
+            self._sent_times[universe] = now
             self._connected = True
-        except ValueError as e:
+            return True
+        except ValueError:
             self._connected = False
-            print(self._dmx_frame)
-            # TODO: Remove this one all bugs have been fixed
-            raise e
+            raise
 
-    def get_dmx_frame(self):
-        """Return the DMX frame."""
-        return tuple(self._dmx_frame)
+    def render_universes(self, universes, changed_only=False):
+        """Sends the DMX messages of several universes back to back.
+
+        If sync is enabled and any frame was sent, a sync packet follows
+        the burst so that every receiver outputs the same frame together.
+
+        universes (list): The universes to send.
+        changed_only (bool): See render().
+
+        Returns whether any frame was sent.
+        """
+        sent = False
+        for universe in universes:
+            if self.render(universe, changed_only=changed_only):
+                sent = True
+        if sent and self.sync:
+            self._send_sync()
+        return sent
+
+    def get_dmx_frame(self, universe=0):
+        """Return the DMX frame of a universe."""
+        return tuple(self._frame(universe))
+
+    def universes(self):
+        """Return the universes that have a DMX frame."""
+        return sorted(self._dmx_frames.keys())
 
     def connected(self):
         return self._connected
 
 
+class SacnConnection(DmxConnection):
+    """Sends DMX messages over the network using sACN (E1.31).
+
+    Universe u of the project is sent as sACN universe u + 1, since
+    universe 0 is reserved by E1.31. Packets are multicast to the address
+    of their universe unless a unicast host is given.
+    """
+
+    # Offsets in the E1.31 data packet.
+    PRIORITY_OFFSET = 108
+    SEQUENCE_OFFSET = 111
+    UNIVERSE_OFFSET = 113
+    PACKET_SIZE = 126 + DMX_SIZE
+
+    # Offsets in the E1.31 synchronization packet.
+    SYNC_SEQUENCE_OFFSET = 44
+    SYNC_PACKET_SIZE = 49
+
+    def __init__(
+        self,
+        host=None,
+        keep_alive=DEFAULT_KEEP_ALIVE,
+        priority=SACN_DEFAULT_PRIORITY,
+        source_name="CodeDMX",
+        interface=None,
+        sync_universe=None,
+    ):
+        """Constructor.
+
+        host (str): Unicast destination. If None, packets are multicast.
+        keep_alive (float): Seconds after which an unchanged frame is resent.
+        priority (int): The sACN priority of the data [0, 200].
+        source_name (str): The name receivers display for this source.
+        interface (str): IP address of the interface multicast is sent from.
+        sync_universe (int): If set, the universe synchronization packets are
+                             sent on after a burst from render_universes().
+        """
+        if not 0 <= priority <= SACN_MAX_PRIORITY:
+            raise RuntimeError(f"Invalid sACN priority {priority}")
+        self.host = host
+        self.priority = priority
+        self.source_name = source_name
+        self._cid = uuid.uuid4().bytes
+        self._sequences = {}
+        self._destinations = {}
+
+        self._sacn_sync_universe = 0
+        self._sync_packet = None
+        if sync_universe is not None:
+            self._sacn_sync_universe = sync_universe + 1
+            if self._sacn_sync_universe > SACN_MAX_UNIVERSE:
+                raise RuntimeError(f"Invalid sync universe {sync_universe}")
+            self._sync_packet = self._make_sync_packet()
+            self._sync_sequence = 0
+            self._sync_destination = (
+                host or self.multicast_address(self._sacn_sync_universe),
+                SACN_PORT,
+            )
+
+        super().__init__(
+            (host, SACN_PORT),
+            keep_alive=keep_alive,
+            sync=sync_universe is not None,
+        )
+        if interface is not None:
+            self._socket.setsockopt(
+                socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface)
+            )
+
+    @staticmethod
+    def multicast_address(sacn_universe):
+        """Return the multicast group of a sACN universe."""
+        return f"239.255.{sacn_universe >> 8}.{sacn_universe & 0xFF}"
+
+    def _make_packet(self, universe):
+        sacn_universe = universe + 1
+        if sacn_universe > SACN_MAX_UNIVERSE:
+            raise RuntimeError(f"Invalid universe {universe}")
+
+        source_name = self.source_name.encode("utf-8")[:63]
+        packet = bytearray(self.PACKET_SIZE)
+        # Root layer
+        struct.pack_into(
+            "!HH12sHI16s",
+            packet,
+            0,
+            0x0010,
+            0x0000,
+            b"ASC-E1.17",
+            0x7000 | (self.PACKET_SIZE - 16),
+            0x00000004,
+            self._cid,
+        )
+        # Framing layer
+        struct.pack_into(
+            "!HI64sBHBBH",
+            packet,
+            38,
+            0x7000 | (self.PACKET_SIZE - 38),
+            0x00000002,
+            source_name,
+            self.priority,
+            self._sacn_sync_universe,
+            0,  # Sequence number
+            0,  # Options
+            sacn_universe,
+        )
+        # DMP layer
+        struct.pack_into(
+            "!HBBHHHB",
+            packet,
+            115,
+            0x7000 | (self.PACKET_SIZE - 115),
+            0x02,
+            0xA1,
+            0x0000,
+            0x0001,
+            DMX_SIZE + 1,
+            0x00,  # START code
+        )
+
+        self._sequences[universe] = 0
+        self._destinations[universe] = (
+            self.host or self.multicast_address(sacn_universe),
+            SACN_PORT,
+        )
+        return packet
+
+    def _make_sync_packet(self):
+        packet = bytearray(self.SYNC_PACKET_SIZE)
+        # Root layer
+        struct.pack_into(
+            "!HH12sHI16s",
+            packet,
+            0,
+            0x0010,
+            0x0000,
+            b"ASC-E1.17",
+            0x7000 | (self.SYNC_PACKET_SIZE - 16),
+            0x00000008,
+            self._cid,
+        )
+        # Framing layer, followed by two reserved bytes.
+        struct.pack_into(
+            "!HIBH",
+            packet,
+            38,
+            0x7000 | (self.SYNC_PACKET_SIZE - 38),
+            0x00000001,
+            0,  # Sequence number
+            self._sacn_sync_universe,
+        )
+        return packet
+
+    def _send(self, universe):
+        packet = self._packets[universe]
+        sequence = (self._sequences[universe] + 1) & 0xFF
+        self._sequences[universe] = sequence
+        packet[self.SEQUENCE_OFFSET] = sequence
+        self._socket.sendto(packet, self._destinations[universe])
+
+    def _send_sync(self):
+        self._sync_sequence = (self._sync_sequence + 1) & 0xFF
+        self._sync_packet[self.SYNC_SEQUENCE_OFFSET] = self._sync_sequence
+        self._socket.sendto(self._sync_packet, self._sync_destination)
+
+
 class NodeDmxServer:
     """Server that listens for packets containing DMX information from one or more NodeDmxClients.
 
@@ -185,7 +464,9 @@ class NodeDmxClient:
         self._server_addr = server_addr
         self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self._dmx_address = dmx_address
-        self._dmx_sub_frame = [0] * n_channels
+        # Preallocated packet, the DMX offset followed by the channels.
+        self._packet = bytearray(struct.pack("B", dmx_address) + bytes(n_channels))
+        self._dmx_sub_frame = memoryview(self._packet)[1:]
         self._connected = True
 
     def set_channel(self, channel, value):
@@ -193,19 +474,21 @@ class NodeDmxClient:
 
     def set_channels(self, start_channel, values):
         start_channel -= 1
-        self._dmx_sub_frame[start_channel : start_channel + len(values)] = values
+        self._dmx_sub_frame[start_channel : start_channel + len(values)] = bytes(values)
+
+    def get_dmx_buffer(self):
+        """Return a writable memoryview of the channels sent by send_frame()."""
+        return self._dmx_sub_frame
 
     def send_frame(self):
-        packet = struct.pack("B", self._dmx_address)
-        packet += bytes(self._dmx_sub_frame)
         try:
-            self._socket.sendto(packet, self._server_addr)
+            self._socket.sendto(self._packet, self._server_addr)
             self._connected = True
         except:
             self._connected = False
 
     def clear(self):
-        self._dmx_sub_frame = [0] * len(self._dmx_sub_frame)
+        self._dmx_sub_frame[:] = bytes(len(self._dmx_sub_frame))
 
     def connected(self):
         return self._connected
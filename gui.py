@@ -1,4 +1,5 @@
 from inspect import getmembers, isfunction
+from collections import deque
 import os
 import dearpygui.dearpygui as dpg
 import textwrap
@@ -7,8 +8,10 @@ import mido
 import re
 import json
 import socket
+import time
 import clipboard
 import model
+import ringlog
 import util
 import functions
 import fixtures
@@ -915,6 +918,9 @@ class TrackPropertiesWindow(ResettableWindow):
                 dpg.add_table_column(
                     label="DMX Ch.", tag=f"{output_table_tag}.column.dmx_address"
                 )
+                dpg.add_table_column(
+                    label="Universe", tag=f"{output_table_tag}.column.universe"
+                )
                 dpg.add_table_column(
                     label="Name", tag=f"{output_table_tag}.column.name"
                 )
@@ -2169,8 +2175,15 @@ class ClipWindow(Window):
 
 
 class ConsoleWindow(Window):
+    # Number of log lines shown.
+    MAX_LINES = 200
+
     def __init__(self, state):
         self.current_log = state.log
+        # Position in current_log of the next entry to show.
+        self.log_position = 0
+        # Tags of the lines shown, newest first.
+        self.line_tags = deque()
 
         with dpg.theme(tag="clear_button.theme"):
             with dpg.theme_component(dpg.mvAll):
@@ -2200,30 +2213,55 @@ class ConsoleWindow(Window):
 
                 def clear_errors():
                     self.current_log.clear()
+                    self.show_log(self.current_log)
 
                 dpg.add_button(label="Clear", callback=clear_errors)
                 dpg.bind_item_theme(dpg.last_item(), "clear_button.theme")
 
                 def show_debug():
-                    self.current_log = self.state.log
+                    self.show_log(self.state.log)
 
                 dpg.add_button(label="Debug", callback=show_debug)
 
                 def show_osc():
-                    self.current_log = self.state.osc_log
+                    self.show_log(self.state.osc_log)
 
                 dpg.add_button(label="OSC", callback=show_osc)
 
                 def show_midi():
-                    self.current_log = self.state.midi_log
+                    self.show_log(self.state.midi_log)
 
                 dpg.add_button(label="MIDI", callback=show_midi)
 
-            dpg.add_text(tag="io_debug.text")
+            dpg.add_group(tag="io_debug.group")
+
+    def show_log(self, log):
+        self.current_log = log
+        self.log_position = 0
+        self.line_tags.clear()
+        dpg.delete_item("io_debug.group", children_only=True)
 
     def update(self):
-        console_text = "\n".join(str(e) for e in self.current_log[::-1])
-        dpg.set_value("io_debug.text", console_text)
+        # Only the entries added since the last frame are rendered.
+        entries, self.log_position = self.current_log.entries_since(
+            self.log_position
+        )
+        for entry in entries[-self.MAX_LINES :]:
+            before = self.line_tags[0] if self.line_tags else 0
+            tag = dpg.add_text(
+                format_log_entry(entry), parent="io_debug.group", before=before
+            )
+            self.line_tags.appendleft(tag)
+
+        while len(self.line_tags) > self.MAX_LINES:
+            dpg.delete_item(self.line_tags.pop())
+
+
+def format_log_entry(entry):
+    timestamp = time.strftime("%H:%M:%S", time.localtime(entry.time))
+    if entry.level in [ringlog.WARNING, ringlog.ERROR]:
+        return f"[{timestamp}] {entry.level.upper()}: {entry.message}"
+    return f"[{timestamp}] {entry.message}"
 
 
 class CodeWindow(ResettableWindow):
@@ -3090,7 +3128,7 @@ class SequenceConfigurationWindow(ResettableWindow):
                     if seq_info and duration:
                         seq_info.append(duration)
                         sequence_info.append(seq_info)
-                        self.state.log.append("Invalid sequence entry")
+                        self.state.log.warning("Invalid sequence entry")
 
                 if sequence_info:
                     name = dpg.get_value("sequence.name")
@@ -3111,7 +3149,7 @@ class SequenceConfigurationWindow(ResettableWindow):
                         self.hide()
                         APP.sequences_window.reset()
                     else:
-                        self.state.log.append("Failed to add sequence")
+                        self.state.log.warning("Failed to add sequence")
 
             def preset_selected(sender, app_data, user_data):
                 i, title, clip, preset = user_data
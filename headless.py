@@ -0,0 +1,162 @@
+"""Runs a CodeDMX project without the GUI.
+
+Intended for machines without a display (e.g. a rack machine driving
+Art-Net). Only the model is imported, dearpygui is never loaded.
+
+Example:
+    python headless.py --project show/show.ndmx --preset Intro
+"""
+import argparse
+import json
+import logging
+
+import model
+import scheduler
+import util
+
+logging.basicConfig(
+    filename="log.txt",
+    filemode="w",
+    format="[%(asctime)s][%(levelname)s][%(name)s] %(message)s",
+    level=logging.DEBUG,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class HeadlessApplication:
+    """Runs the state updates of a project with no GUI."""
+
+    def __init__(self, tick_rate=scheduler.DEFAULT_TICK_RATE):
+        self.state = model.ProgramState()
+        self.scheduler = scheduler.TickScheduler(tick_rate)
+        self.done = False
+
+    def open_project(self, project_file_path):
+        logger.debug("Opening %s", project_file_path)
+        with open(project_file_path, "r") as f:
+            data = json.load(f)
+        self.state.deserialize(data["state"], project_file_path)
+        self.connect_io()
+
+    def connect_io(self):
+        """Report the state of every I/O device of the project.
+
+        Devices connect when they are created by ProgramState.deserialize,
+        any device that failed to do so is given another chance here.
+        """
+        for io_list in [self.state.io_inputs, self.state.io_outputs]:
+            for io in io_list:
+                if io is None:
+                    continue
+                if not io.connected():
+                    io.connect()
+                logger.info(
+                    "%s(%s) connected: %s", io.type, io.args, io.connected()
+                )
+
+    def play_clip(self, track_i, clip_i):
+        track = self.state.tracks[track_i]
+        clip = track[clip_i]
+        if not util.valid(clip):
+            raise RuntimeError(f"No clip at track {track_i}, slot {clip_i}")
+        self.state.execute(f"play_clip {track.id} {clip.id}")
+
+    def play_multi_clip_preset(self, name):
+        for multi_clip_preset in self.state.multi_clip_presets:
+            if multi_clip_preset.name == name and not multi_clip_preset.deleted:
+                multi_clip_preset.execute()
+                return
+        raise RuntimeError(f"No preset named {name}")
+
+    def run(self):
+        """Run the state loop in the calling thread until stopped."""
+        logger.debug("Starting state loop")
+        self.state.start()
+        try:
+            self.state_loop()
+        except KeyboardInterrupt:
+            logger.info("Interrupted.")
+        finally:
+            self.state.stop_output_threads()
+
+    def stop(self):
+        self.done = True
+
+    def state_loop(self):
+        self.scheduler.run(self.state.update, lambda: self.done)
+
+
+def parse_clip_slot(text):
+    track_i, clip_i = text.split(",")
+    return int(track_i), int(clip_i)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="CodeDMX [BETA] (Headless)")
+    parser.add_argument(
+        "--project",
+        required=True,
+        dest="project_file_path",
+        help="Project file path.",
+    )
+
+    parser.add_argument(
+        "--clip",
+        default=[],
+        action="append",
+        type=parse_clip_slot,
+        dest="clips",
+        help="Clip to play on start, as 'track,slot'. Can be repeated.",
+    )
+
+    parser.add_argument(
+        "--preset",
+        default=[],
+        action="append",
+        dest="presets",
+        help="Name of a multi clip preset to play on start. Can be repeated.",
+    )
+
+    parser.add_argument(
+        "--rate",
+        default=scheduler.DEFAULT_TICK_RATE,
+        type=float,
+        dest="tick_rate",
+        help="State updates per second.",
+    )
+
+    parser.add_argument(
+        "--sync",
+        default=None,
+        dest="sync_source",
+        help="Name of a MIDI input whose clock or MTC drives the beat.",
+    )
+
+    parser.add_argument(
+        "--profile-output",
+        default=None,
+        dest="profile_output_path",
+        help="File the state loop timings are written to on exit.",
+    )
+
+    args = parser.parse_args()
+
+    app = HeadlessApplication(args.tick_rate)
+    app.open_project(args.project_file_path)
+
+    if args.sync_source is not None:
+        app.state.execute(f"set_sync_source {args.sync_source}")
+
+    for track_i, clip_i in args.clips:
+        app.play_clip(track_i, clip_i)
+
+    for preset_name in args.presets:
+        app.play_multi_clip_preset(preset_name)
+
+    app.run()
+
+    if args.profile_output_path:
+        app.state.profiler.dump(args.profile_output_path)
+
+    logging.info("Exiting.")
@@ -0,0 +1,195 @@
+import collections
+import heapq
+import itertools
+import time
+
+# Messages that can wait for the next tick, per kind of event.
+DEFAULT_CAPACITY = 4096
+
+
+class InputEventQueue:
+    """Input events waiting to be applied by the state loop.
+
+    The OSC and MIDI threads push events, the state loop drains them all
+    at the start of each tick, so the model is only modified from the
+    state loop.
+
+    The queue is lock-free: pushing is a single deque append, which is
+    atomic, and everything else is done by the state loop when it drains.
+    An input thread never waits for the state loop.
+
+    Values are coalesced when they are pushed: each key has a slot holding
+    only its latest value, and a key waits in the queue once however many
+    values it receives before the next tick. Memory and the work of a
+    drain are bounded by the number of distinct keys rather than by the
+    message rate. Coalesced messages are counted per key. Trigger events
+    are discrete and are never coalesced, two taps within a tick fire
+    twice.
+
+    Events that must be applied together, like the messages of an OSC
+    bundle, are pushed as a batch with the time they are due. Batches are
+    not coalesced, every update and trigger of a batch is applied on the
+    first tick at or after its due time.
+
+    A new value of a key that is already waiting always replaces the
+    previous one. When the queue is full, values of keys that are not
+    waiting yet, triggers and batches are dropped and counted. The counts
+    are only statistics, they can miss an event when input threads race.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        """Constructor.
+
+        capacity (int): Maximum number of keys with a value, of triggers
+                        and of batches waiting to be drained.
+        """
+        self.capacity = capacity
+        self.received = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.coalesced_counts = collections.Counter()
+        # key -> deque holding the (value, apply) latest pushed. Slots are
+        # never removed, so a slot a producer holds is never orphaned.
+        self._slots = {}
+        # Keys whose slot was filled since they were last drained.
+        self._keys = collections.deque()
+        # key -> receive time of the first value of each waiting key.
+        self._waiting_since = {}
+        # ((type, event), receive time) of the triggers pushed.
+        self._triggers = collections.deque()
+        # (due time, updates, triggers, receive time) of the batches pushed.
+        self._incoming_batches = collections.deque()
+        # Heap of (due time, push order, updates, triggers, receive time)
+        # of the batches that are not due yet, only used by the state loop.
+        self._batches = []
+        self._batch_order = itertools.count()
+
+    def push(self, key, value, apply):
+        """Call apply(value) on the next tick, with the latest value of key.
+
+        key (hashable): What the value is for, e.g. an OSC endpoint.
+        value (any): The value.
+        apply (function): Called with the value from the state loop.
+        """
+        received_ns = time.perf_counter_ns()
+        self.received += 1
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._slots.setdefault(key, collections.deque(maxlen=1))
+        if key in self._waiting_since:
+            # The previous value is replaced, see drain() for the ordering.
+            slot.append((value, apply))
+            self.coalesced += 1
+            self.coalesced_counts[key] += 1
+            if key in self._waiting_since:
+                return
+        elif len(self._keys) >= self.capacity:
+            self.dropped += 1
+            return
+        else:
+            slot.append((value, apply))
+        self._waiting_since[key] = received_ns
+        self._keys.append(key)
+
+    def push_value(self, channel, value):
+        """Set the external value of an input channel on the next tick."""
+        self.push(channel, value, channel.ext_set)
+
+    def push_trigger(self, type_, event):
+        """Fire the triggers of an event on the next tick."""
+        if len(self._triggers) >= self.capacity:
+            self.dropped += 1
+            return
+        self._triggers.append(((type_, event), time.perf_counter_ns()))
+
+    def push_batch(self, updates, triggers, due_ns=None):
+        """Apply updates and fire triggers on the same tick.
+
+        updates (list): (apply, value) pairs, applied in order.
+        triggers (list): (type, event) of the triggers to fire.
+        due_ns (int): perf_counter_ns() time before which the batch is not
+                      applied. Applied on the next tick if None.
+        """
+        received_ns = time.perf_counter_ns()
+        if due_ns is None:
+            due_ns = received_ns
+        if len(self._incoming_batches) + len(self._batches) >= self.capacity:
+            self.dropped += len(updates) + len(triggers)
+            return
+        # Latency of a scheduled batch is measured from its due time.
+        self._incoming_batches.append(
+            (due_ns, updates, triggers, max(received_ns, due_ns))
+        )
+
+    def __len__(self):
+        return (
+            len(self._keys)
+            + len(self._triggers)
+            + len(self._incoming_batches)
+            + len(self._batches)
+        )
+
+    def drain(self):
+        """Remove every pending event. Only called from the state loop.
+
+        Returns a list of (apply, value) in the order the keys were first
+        received, a list of (type, event) triggers and the receive time
+        (perf_counter_ns) of the oldest event, or None if there were none.
+        Batches that are due come after the coalesced events, in order of
+        due time. Batches that are not due yet stay in the queue.
+        """
+        now_ns = time.perf_counter_ns()
+        oldest_ns = None
+
+        # Only what was pushed before the drain started is taken, so input
+        # threads pushing meanwhile can not keep the state loop here.
+        # A key stops waiting before its slot is emptied: a value pushed in
+        # between is either taken now, or queues the key again.
+        updates = []
+        for _ in range(len(self._keys)):
+            key = self._keys.popleft()
+            received_ns = self._waiting_since.pop(key, None)
+            try:
+                value, apply = self._slots[key].pop()
+            except IndexError:
+                # Already taken, the key was queued twice.
+                continue
+            updates.append((apply, value))
+            if received_ns is not None and (
+                oldest_ns is None or received_ns < oldest_ns
+            ):
+                oldest_ns = received_ns
+
+        triggers = []
+        count = len(self._triggers)
+        for _ in range(count):
+            trigger, received_ns = self._triggers.popleft()
+            triggers.append(trigger)
+            if oldest_ns is None or received_ns < oldest_ns:
+                oldest_ns = received_ns
+        self.received += count
+
+        for _ in range(len(self._incoming_batches)):
+            due_ns, batch_updates, batch_triggers, received_ns = (
+                self._incoming_batches.popleft()
+            )
+            self.received += len(batch_updates) + len(batch_triggers)
+            heapq.heappush(
+                self._batches,
+                (
+                    due_ns,
+                    next(self._batch_order),
+                    batch_updates,
+                    batch_triggers,
+                    received_ns,
+                ),
+            )
+        while self._batches and self._batches[0][0] <= now_ns:
+            _, _, batch_updates, batch_triggers, received_ns = heapq.heappop(
+                self._batches
+            )
+            updates.extend(batch_updates)
+            triggers.extend(batch_triggers)
+            if oldest_ns is None or received_ns < oldest_ns:
+                oldest_ns = received_ns
+        return updates, triggers, oldest_ns
@@ -0,0 +1,257 @@
+"""Fast evaluation of automation curves.
+
+Automations are compiled into piecewise polynomials (at most cubic) once,
+when their points change. Evaluating a single beat is then a bisect and a
+few multiplications, instead of a call into scipy.interpolate.interp1d.
+The results match interp1d(x, y, kind=kind, bounds_error=False).
+"""
+import math
+from bisect import bisect_right
+
+import numpy as np
+import scipy.interpolate
+
+# Number of polynomial coefficients stored for each piece (cubic).
+N_COEFFS = 4
+
+SPLINE_ORDERS = {
+    "zero": 0,
+    "slinear": 1,
+    "quadratic": 2,
+    "cubic": 3,
+}
+
+KINDS = ["linear", "nearest", "nearest-up", "previous", "next"] + list(
+    SPLINE_ORDERS.keys()
+)
+
+
+class PiecewisePolynomial:
+    """A function defined by one polynomial per piece.
+
+    Piece i is used for starts[i] <= x < starts[i + 1] and evaluates
+    sum(coeffs[k][i] * (x - origins[i]) ** k). Values outside of
+    [x_min, x_max] are NaN.
+    """
+
+    def __init__(self, starts, origins, coeffs, x_min, x_max):
+        """Constructor.
+
+        starts (list): The first x value of each piece, ascending.
+        origins (list): The x value each piece's polynomial is relative to.
+        coeffs (list): N_COEFFS lists holding the coefficients of each piece,
+                       lowest order first.
+        x_min (float): The lowest valid x value.
+        x_max (float): The highest valid x value.
+        """
+        self.starts = starts
+        self.origins = origins
+        self.coeffs = coeffs
+        self.x_min = x_min
+        self.x_max = x_max
+        self.degree = max(
+            [k for k in range(N_COEFFS) if any(coeffs[k])], default=0
+        )
+
+        self.starts_array = np.array(starts, dtype=float)
+        self.origins_array = np.array(origins, dtype=float)
+        self.coeffs_array = np.array(coeffs, dtype=float)
+
+    def __call__(self, x):
+        if np.ndim(x) == 0:
+            return self.evaluate(x)
+        return self.evaluate_array(np.asarray(x, dtype=float))
+
+    def evaluate(self, x):
+        """Evaluate a single x value."""
+        if not self.x_min <= x <= self.x_max:
+            return math.nan
+
+        i = bisect_right(self.starts, x) - 1
+        if i < 0:
+            i = 0
+
+        c0, c1, c2, c3 = self.coeffs
+        if self.degree == 0:
+            return c0[i]
+
+        dx = x - self.origins[i]
+        if self.degree == 1:
+            return c1[i] * dx + c0[i]
+        return ((c3[i] * dx + c2[i]) * dx + c1[i]) * dx + c0[i]
+
+    def evaluate_array(self, x):
+        """Evaluate an array of x values."""
+        i = np.searchsorted(self.starts_array, x, side="right") - 1
+        np.clip(i, 0, None, out=i)
+
+        c0, c1, c2, c3 = self.coeffs_array[:, i]
+        dx = x - self.origins_array[i]
+        y = ((c3 * dx + c2) * dx + c1) * dx + c0
+        y[~((self.x_min <= x) & (x <= self.x_max))] = np.nan
+        return y
+
+
+def _constant_pieces(starts, origins, values):
+    zeros = [0.0] * len(values)
+    return starts, origins, [values, zeros, list(zeros), list(zeros)]
+
+
+def _linear(x, y):
+    n = len(x)
+    slopes = []
+    for i in range(n - 1):
+        dx = x[i + 1] - x[i]
+        slopes.append((y[i + 1] - y[i]) / dx if dx else math.nan)
+    # The last point is its own piece so that it is returned exactly.
+    slopes.append(0.0)
+    zeros = [0.0] * n
+    return list(x), list(x), [list(y), slopes, zeros, list(zeros)]
+
+
+def _nearest(x, y, up):
+    # Midpoints are computed the same way as interp1d to get the same ties.
+    mids = [x[i] / 2.0 + x[i + 1] / 2.0 for i in range(len(x) - 1)]
+    if not up:
+        # Ties go to the lower point.
+        mids = [math.nextafter(m, math.inf) for m in mids]
+    starts = [x[0]] + mids
+    return _constant_pieces(starts, starts, list(y))
+
+
+def _previous(x, y):
+    return _constant_pieces(list(x), list(x), list(y))
+
+
+def _next(x, y):
+    starts = [x[0]] + [math.nextafter(v, math.inf) for v in x[:-1]]
+    return _constant_pieces(starts, starts, list(y))
+
+
+def _spline(x, y, order):
+    if len(x) < order + 1:
+        raise ValueError(f"At least {order + 1} points are required")
+    spline = scipy.interpolate.make_interp_spline(x, y, k=order)
+    ppoly = scipy.interpolate.PPoly.from_spline(spline)
+    breaks = ppoly.x
+    starts = []
+    coeffs = [[] for _ in range(N_COEFFS)]
+    for i in range(len(breaks) - 1):
+        # Skip the empty pieces created by repeated knots.
+        if not breaks[i] < breaks[i + 1]:
+            continue
+        starts.append(float(breaks[i]))
+        # PPoly stores the highest order coefficient first.
+        piece = ppoly.c[::-1, i]
+        for k in range(N_COEFFS):
+            coeffs[k].append(float(piece[k]) if k < len(piece) else 0.0)
+
+    # The last point is its own piece so that it matches the spline exactly.
+    starts.append(x[-1])
+    coeffs[0].append(float(spline(x[-1])))
+    for k in range(1, N_COEFFS):
+        coeffs[k].append(0.0)
+    return starts, list(starts), coeffs
+
+
+def make_interpolator(x, y, kind="linear"):
+    """Return a PiecewisePolynomial interpolating the points (x, y).
+
+    x (list): The x values, in any order.
+    y (list): The y values.
+    kind (str): The interp1d kind of interpolation.
+    """
+    if len(x) != len(y):
+        raise ValueError("x and y arrays must be equal in length")
+    if not x:
+        raise ValueError("Can not interpolate without points")
+
+    order = sorted(range(len(x)), key=lambda i: x[i])
+    x = [float(x[i]) for i in order]
+    y = [float(y[i]) for i in order]
+
+    if kind == "linear":
+        pieces = _linear(x, y)
+    elif kind == "nearest":
+        pieces = _nearest(x, y, up=False)
+    elif kind == "nearest-up":
+        pieces = _nearest(x, y, up=True)
+    elif kind == "previous":
+        pieces = _previous(x, y)
+    elif kind == "next":
+        pieces = _next(x, y)
+    elif kind in SPLINE_ORDERS:
+        pieces = _spline(x, y, SPLINE_ORDERS[kind])
+    else:
+        raise ValueError(f"Unknown interpolation {kind}")
+
+    starts, origins, coeffs = pieces
+    return PiecewisePolynomial(starts, origins, coeffs, x[0], x[-1])
+
+
+class PiecewisePolynomialBatch:
+    """Evaluates many PiecewisePolynomials, one x value each, in one go.
+
+    The pieces of every function are concatenated into flat arrays which
+    are only rebuilt when the set of functions changes. Pieces are keyed by
+    the complex number row + 1j * start, which sorts by function first and
+    start second, so a single np.searchsorted finds the piece of every x
+    among the pieces of its own function.
+    """
+
+    def __init__(self):
+        self.functions = []
+        self._keys = np.zeros(0, dtype=complex)
+        self._queries = np.zeros(0, dtype=complex)
+        self._first_pieces = np.zeros(0, dtype=int)
+        self._origins = np.zeros(0)
+        self._coeffs = np.zeros((N_COEFFS, 0))
+        self._x_min = np.zeros(0)
+        self._x_max = np.zeros(0)
+
+    def set_functions(self, functions):
+        """Set the functions to evaluate.
+
+        functions (list): The PiecewisePolynomials, in the order their
+                          x values will be given to evaluate().
+        """
+        if functions == self.functions:
+            return
+
+        n = len(functions)
+        n_pieces = [len(f.starts) for f in functions]
+        rows = np.arange(n)
+
+        self._keys = np.empty(sum(n_pieces), dtype=complex)
+        self._keys.real = np.repeat(rows, n_pieces)
+        self._keys.imag = np.concatenate(
+            [np.zeros(0)] + [f.starts_array for f in functions]
+        )
+        self._queries = np.empty(n, dtype=complex)
+        self._queries.real = rows
+        self._first_pieces = np.cumsum([0] + n_pieces[:-1])
+        self._origins = np.concatenate(
+            [np.zeros(0)] + [f.origins_array for f in functions]
+        )
+        self._coeffs = np.concatenate(
+            [np.zeros((N_COEFFS, 0))] + [f.coeffs_array for f in functions], axis=1
+        )
+        self._x_min = np.array([f.x_min for f in functions], dtype=float)
+        self._x_max = np.array([f.x_max for f in functions], dtype=float)
+        self.functions = list(functions)
+
+    def evaluate(self, x):
+        """Evaluate function i at x[i] for every function.
+
+        x (np.ndarray): One x value per function.
+        """
+        self._queries.imag = x
+        i = np.searchsorted(self._keys, self._queries, side="right") - 1
+        # Below its first start, an x is evaluated with its first piece.
+        np.maximum(i, self._first_pieces, out=i)
+
+        c0, c1, c2, c3 = self._coeffs[:, i]
+        dx = x - self._origins[i]
+        y = ((c3 * dx + c2) * dx + c1) * dx + c0
+        y[~((self._x_min <= x) & (x <= self._x_max))] = np.nan
+        return y
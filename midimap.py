@@ -0,0 +1,64 @@
+from collections import defaultdict
+
+
+class MidiMappingTable:
+    """Maps (device, MIDI channel, note/control) keys to inputs.
+
+    An input is mapped to at most one key. The reverse index from input to
+    key makes mapping, unmapping and looking up the inputs of a key
+    constant time, whatever the number of devices and mappings.
+
+    The inputs of a key are stored as a tuple that is replaced when it
+    changes, so a reader never sees a list being modified.
+    """
+
+    def __init__(self):
+        # (device, midi channel, note/control) -> (input, ...)
+        self.inputs = {}
+        # input -> (device, midi channel, note/control)
+        self.keys = {}
+        # device -> {(device, midi channel, note/control), ...}
+        self.device_keys = defaultdict(set)
+
+    def map(self, key, input_channel):
+        """Map an input to a key, unmapping it from its previous key."""
+        self.unmap(input_channel)
+        self.inputs[key] = self.inputs.get(key, ()) + (input_channel,)
+        self.keys[input_channel] = key
+        self.device_keys[key[0]].add(key)
+
+    def unmap(self, input_channel):
+        """Unmap an input. Returns its previous key, or None if it was not mapped."""
+        key = self.keys.pop(input_channel, None)
+        if key is None:
+            return None
+
+        inputs = tuple(
+            other for other in self.inputs[key] if other is not input_channel
+        )
+        if inputs:
+            self.inputs[key] = inputs
+        else:
+            del self.inputs[key]
+            self.device_keys[key[0]].discard(key)
+        return key
+
+    def unmap_device(self, device):
+        """Unmap every input of a device."""
+        for key in self.device_keys.pop(device, ()):
+            for input_channel in self.inputs.pop(key):
+                del self.keys[input_channel]
+
+    def get(self, key):
+        """Return the inputs mapped to a key."""
+        return self.inputs.get(key, ())
+
+    def key(self, input_channel):
+        return self.keys.get(input_channel)
+
+    def device_items(self, device):
+        """Return the (key, inputs) of every key of a device, sorted by key."""
+        return [
+            (key, self.inputs[key])
+            for key in sorted(self.device_keys.get(device, ()), key=lambda k: k[1:])
+        ]
@@ -0,0 +1,261 @@
+"""Follows an external MIDI clock or MIDI Time Code (MTC).
+
+MIDI messages arrive with the jitter of the MIDI driver and USB stack,
+using their arrival times directly would make the beat stutter. The
+arrival times of the clock pulses (24 per beat) or MTC quarter frames
+are filtered with a delay-locked loop (F. Adriaensen, "Using a DLL to
+filter time", 2005), a second order loop that tracks both the phase and
+the period of the pulses. The position at any time is then interpolated
+between filtered pulses, so the beat has sub-tick precision, and it is
+counted in pulses so it does not drift from the source however long it
+runs.
+"""
+import collections
+import math
+import threading
+
+PULSES_PER_BEAT = 24
+SIXTEENTHS_PER_BEAT = 4
+
+# Without a pulse for this long the source is considered lost.
+DEFAULT_TIMEOUT_S = 1.0
+
+# Loop bandwidth, higher follows tempo changes faster but lets more
+# jitter through.
+DEFAULT_BANDWIDTH_HZ = 1.0
+
+# The tempo is measured over the filtered times of this many pulses, a
+# bar of 4/4.
+TEMPO_PULSES = 4 * PULSES_PER_BEAT
+
+# How far past the last pulse the position is extrapolated, in pulses.
+# The position holds there if the pulses stop.
+MAX_EXTRAPOLATION = 1.0
+
+MTC_FRAME_RATES = (24.0, 25.0, 30000 / 1001, 30.0)
+
+MESSAGE_TYPES = {
+    "clock",
+    "start",
+    "stop",
+    "continue",
+    "songpos",
+    "quarter_frame",
+}
+
+
+class DelayLockedLoop:
+    """Filters the times of periodic events."""
+
+    def __init__(self, t, period, bandwidth_hz=DEFAULT_BANDWIDTH_HZ):
+        """Constructor.
+
+        t (float): Time of the first event, in seconds.
+        period (float): Expected time between events, in seconds.
+        bandwidth_hz (float): Bandwidth of the loop.
+        """
+        self.bandwidth_hz = bandwidth_hz
+        # Number of events after the first one.
+        self.count = 0
+        # Filtered time of the last event, predicted time of the next one.
+        self.t0 = t
+        self.t1 = t + period
+        self.period = period
+
+    def update(self, t):
+        """Add an event that happened at time t."""
+        omega = 2 * math.pi * self.bandwidth_hz * self.period
+        error = t - self.t1
+        self.t0 = self.t1
+        self.t1 += math.sqrt(2) * omega * error + self.period
+        self.period += omega * omega * error
+        self.count += 1
+
+    def position(self, t):
+        """Return the number of events at time t, including the fraction
+        of the current period."""
+        fraction = (t - self.t0) / self.period
+        return self.count + min(max(fraction, 0.0), MAX_EXTRAPOLATION)
+
+
+class MidiClockSync:
+    """Beat position and tempo following MIDI clock and MTC messages.
+
+    receive() is called from the MIDI thread, the other methods from the
+    state loop.
+    """
+
+    def __init__(
+        self, timeout_s=DEFAULT_TIMEOUT_S, bandwidth_hz=DEFAULT_BANDWIDTH_HZ
+    ):
+        """Constructor.
+
+        timeout_s (float): Time without messages after which the source
+                           is considered lost.
+        bandwidth_hz (float): Bandwidth of the delay-locked loops.
+        """
+        self.timeout_s = timeout_s
+        self.bandwidth_hz = bandwidth_hz
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            # MIDI clock
+            self._clock = None
+            self._last_clock_t = None
+            self._pulse_times = collections.deque(maxlen=TEMPO_PULSES + 1)
+            self._running = True
+            # Pulse of the clock's pulse count 0.
+            self._pulse_offset = 0
+            # Position while stopped, in pulses.
+            self._held_pulse = 0.0
+            # Pulse the next clock message is, after a start, continue
+            # or song position message.
+            self._next_pulse = None
+            # MTC
+            self._mtc = None
+            self._last_mtc_t = None
+            self._mtc_pieces = [None] * 8
+            self._mtc_rate = MTC_FRAME_RATES[1]
+            # Seconds of the MTC quarter frame count 0.
+            self._mtc_offset_s = None
+            # Beat returned last, the position never goes back unless the
+            # source relocates it.
+            self._last_beat = None
+
+    def receive(self, message, t):
+        """Handle a clock, transport or MTC message received at time t."""
+        with self._lock:
+            if message.type == "clock":
+                self._receive_clock(t)
+            elif message.type == "start":
+                # The next clock is the first pulse of the song.
+                self._held_pulse = 0.0
+                self._next_pulse = 0
+                self._running = False
+                self._last_beat = None
+            elif message.type == "continue":
+                self._held_pulse = self._clock_pulse(t)
+                self._next_pulse = self._held_pulse
+                self._running = False
+            elif message.type == "stop":
+                self._held_pulse = self._clock_pulse(t)
+                self._running = False
+            elif message.type == "songpos":
+                pulse = message.pos * PULSES_PER_BEAT // SIXTEENTHS_PER_BEAT
+                self._held_pulse = float(pulse)
+                self._last_beat = None
+                if self._running:
+                    self._next_pulse = pulse
+            elif message.type == "quarter_frame":
+                self._receive_quarter_frame(
+                    message.frame_type, message.frame_value, t
+                )
+
+    def _receive_clock(self, t):
+        if self._clock is None or t - self._last_clock_t > self.timeout_s:
+            # Assume 120 bpm until the loop locks on the real period.
+            period = 60.0 / (120.0 * PULSES_PER_BEAT)
+            if self._clock is not None:
+                period = self._clock.period
+                if self._running:
+                    # Carry on counting from the last pulse received.
+                    self._held_pulse = self._clock.count + self._pulse_offset + 1
+            self._clock = DelayLockedLoop(t, period, self.bandwidth_hz)
+            self._pulse_times.clear()
+            if self._next_pulse is None:
+                self._next_pulse = self._held_pulse
+        else:
+            self._clock.update(t)
+        self._last_clock_t = t
+        self._pulse_times.append(self._clock.t0)
+
+        if self._next_pulse is not None:
+            self._pulse_offset = self._next_pulse - self._clock.count
+            self._next_pulse = None
+            self._running = True
+
+    def _clock_pulse(self, t):
+        if not self._running or self._clock is None:
+            return self._held_pulse
+        return self._clock.position(t) + self._pulse_offset
+
+    def _receive_quarter_frame(self, frame_type, frame_value, t):
+        if self._mtc is None or t - self._last_mtc_t > self.timeout_s:
+            period = 1.0 / (4 * self._mtc_rate)
+            self._mtc = DelayLockedLoop(t, period, self.bandwidth_hz)
+            self._mtc_pieces = [None] * 8
+            self._mtc_offset_s = None
+        else:
+            self._mtc.update(t)
+        self._last_mtc_t = t
+
+        self._mtc_pieces[frame_type] = frame_value
+        if frame_type != 7 or None in self._mtc_pieces:
+            return
+
+        # The 8 pieces describe the frame in which piece 0 was sent, this
+        # is piece 7, 7 quarter frames later.
+        p = self._mtc_pieces
+        rate = MTC_FRAME_RATES[(p[7] >> 1) & 0x3]
+        frames = p[0] | ((p[1] & 0x1) << 4)
+        seconds = p[2] | ((p[3] & 0x3) << 4)
+        minutes = p[4] | ((p[5] & 0x3) << 4)
+        hours = p[6] | ((p[7] & 0x1) << 4)
+        time_s = hours * 3600 + minutes * 60 + seconds + (frames + 7 / 4) / rate
+        if rate != self._mtc_rate:
+            self._mtc_rate = rate
+            self._mtc.period = 1.0 / (4 * rate)
+        self._mtc_offset_s = time_s - self._mtc.count / (4 * rate)
+        self._mtc_pieces = [None] * 8
+
+    def clock_locked(self, t):
+        return self._clock is not None and t - self._last_clock_t <= self.timeout_s
+
+    def mtc_locked(self, t):
+        return (
+            self._mtc_offset_s is not None and t - self._last_mtc_t <= self.timeout_s
+        )
+
+    def locked(self, t):
+        """Return True if a clock or MTC was received recently."""
+        with self._lock:
+            return self.clock_locked(t) or self.mtc_locked(t)
+
+    def tempo(self, default):
+        """Return the tempo of the MIDI clock, or default without a clock."""
+        with self._lock:
+            if self._clock is None:
+                return default
+            period = self._clock.period
+            if len(self._pulse_times) > PULSES_PER_BEAT:
+                period = (self._pulse_times[-1] - self._pulse_times[0]) / (
+                    len(self._pulse_times) - 1
+                )
+            return 60.0 / (period * PULSES_PER_BEAT)
+
+    def beat(self, t, tempo):
+        """Return the beat at time t.
+
+        Follows the MIDI clock if there is one, otherwise converts the MTC
+        time to beats with tempo. Returns None if neither is locked.
+        """
+        with self._lock:
+            if self.clock_locked(t):
+                beat = self._clock_pulse(t) / PULSES_PER_BEAT
+            elif self.mtc_locked(t):
+                time_s = self._mtc_offset_s + self._mtc.position(t) / (
+                    4 * self._mtc_rate
+                )
+                beat = time_s * tempo / 60.0
+            else:
+                return None
+
+            if self._last_beat is not None and beat < self._last_beat:
+                # Filtering can move a pulse a little earlier than it was
+                # extrapolated, hold rather than going back.
+                if self._last_beat - beat < 1.0 / PULSES_PER_BEAT:
+                    beat = self._last_beat
+            self._last_beat = beat
+            return beat
@@ -1,5 +1,4 @@
 import re
-import scipy
 import numpy as np
 import time
 import uuid
@@ -12,16 +11,26 @@ import tempfile
 import os
 import traceback
 import importlib
+import functools
 import sys
 
 from collections import defaultdict
-from pythonosc.dispatcher import Dispatcher
-from pythonosc import osc_server
 from pathlib import Path
 from threading import RLock
+from types import MappingProxyType
 
 import util
 import dmxio
+import interpolation
+import inputqueue
+import outputstage
+import profiling
+import ringlog
+import oscserver
+import oscroutes
+import midimap
+import midisync
+import codecache
 
 # For Custom Fuction Nodes
 import colorsys
@@ -189,42 +198,218 @@ class CodeEditorChannel:
 
     This is a restricted version of the Channel that prevents
     a user from doing manipulating the internal models.
+
+    Only get(), set() and value are available. The channel is kept in a
+    slot whose descriptor is removed from the class below, so it can not
+    be reached as an attribute, and there is no __getattribute__ override
+    so valid attributes are found at native speed. Invalid attributes are
+    logged by __getattr__, which only runs when the lookup fails.
     """
 
+    __slots__ = ("_channel",)
+    valid_attributes = ("set", "get", "value")
+
     def __init__(self, channel):
-        self._channel = channel
-        self.valid_attributes = ["set", "get", "value", "__class__"]
+        _set_code_editor_channel(self, channel)
 
-        if isinstance(channel, DmxOutputGroup):
-            super().__getattribute__("valid_attributes").extend(
-                super().__getattribute__("_channel").map.keys()
-            )
+    def get(self):
+        return _get_code_editor_channel(self).get()
+
+    def set(self, value):
+        _get_code_editor_channel(self).set(value)
 
     @property
-    def channel(self, value):
-        pass
+    def value(self):
+        return _get_code_editor_channel(self).get()
 
-    @channel.setter
-    def channel(self, value):
-        attrs = super().__getattribute__("valid_attributes")
-        raise CodeEditorException(
-            f"'channel' is not a valid attribute. Only use: {', '.join(attrs)}"
-        )
+    @value.setter
+    def value(self, value):
+        _get_code_editor_channel(self).set(value)
 
-    def __getattribute__(self, key):
-        attrs = super().__getattribute__("valid_attributes")
-        if key not in attrs:
-            STATE.log.append(
-                CodeEditorException(
-                    f"'{key}' is not a valid attribute. Only use: {', '.join(attrs)}"
-                )
+    def __getattr__(self, key):
+        STATE.log.append(
+            CodeEditorException(
+                f"'{key}' is not a valid attribute. "
+                f"Only use: {', '.join(self.valid_attributes)}"
             )
-            return
-        else:
-            return getattr(super().__getattribute__("_channel"), key)
+        )
 
     def __getitem__(self, key):
-        return super().__getattribute__("_channel")[key]
+        return _get_code_editor_channel(self)[key]
+
+
+_set_code_editor_channel = CodeEditorChannel._channel.__set__
+_get_code_editor_channel = CodeEditorChannel._channel.__get__
+del CodeEditorChannel._channel
+
+
+class CodeEditorOutputGroup(CodeEditorChannel):
+    """CodeEditorChannel of a DmxOutputGroup, its outputs are attributes.
+
+    Use code_editor_group_class() to get the subclass for a set of channel
+    names, it has a read-only property per output backed by a hidden slot.
+
+    values is a NumPy array of the values of the outputs, in order, that
+    can be written to as a whole: Group.values[:] = np.sin(...) * 255.
+    """
+
+    __slots__ = ()
+    valid_attributes = ("values",)
+
+    def __init__(self, group):
+        super().__init__(group)
+        for name, set_output in _CODE_EDITOR_GROUP_SETTERS[type(self)]:
+            set_output(self, group.map[name])
+
+    @property
+    def values(self):
+        return _get_code_editor_channel(self).values
+
+    @values.setter
+    def values(self, values):
+        _get_code_editor_channel(self).values[:] = values
+
+
+class CodeEditorGroupArray:
+    """Several DmxOutputGroups as one array, for clip code:
+
+        Pixels = GroupArray(Strip0, Strip1, Strip2)
+        Pixels.values[:] = np.sin(...) * 255
+
+    The values of the groups are moved into one array, values is a view of
+    it with a row per group if the groups have the same number of outputs,
+    otherwise the values of every group one after the other.
+
+    A group is only ever in one array. Another GroupArray of the same
+    groups, in the same order, shares their array, any other combination
+    including one of them is an error. The groups get their own values
+    back once every clip using the array runs its init code again, see
+    release_group_array(), so the groups can then be combined differently.
+    """
+
+    __slots__ = ("_values",)
+
+    def __init__(self, *groups, owner=None):
+        """Constructor.
+
+        groups (CodeEditorOutputGroup): The groups, in order.
+        owner (Clip): The clip whose init code creates the array.
+        """
+        if not groups:
+            raise CodeEditorException("GroupArray needs at least one output group")
+        groups = tuple(
+            _get_code_editor_channel(group)
+            if isinstance(group, CodeEditorOutputGroup)
+            else group
+            for group in groups
+        )
+        if len({id(group) for group in groups}) != len(groups):
+            raise CodeEditorException("A GroupArray can only have a group once")
+
+        group_array = groups[0].group_array
+        if group_array is not None and group_array[0] == groups:
+            group_array[2].add(owner)
+            if owner is not None:
+                owner.group_arrays.append(group_array)
+            _set_code_editor_group_array_values(self, group_array[1])
+            return
+        for group in groups:
+            if group.group_array is not None:
+                raise CodeEditorException(
+                    f"{group.name} is already in another GroupArray"
+                )
+
+        sizes = [len(group.outputs) for group in groups]
+        values = np.zeros(sum(sizes))
+        start = 0
+        for group, size in zip(groups, sizes):
+            group.bind_values(values[start : start + size])
+            start += size
+        if len(set(sizes)) == 1:
+            values = values.reshape(len(groups), sizes[0])
+
+        group_array = (groups, values, {owner})
+        for group in groups:
+            group.group_array = group_array
+        if owner is not None:
+            owner.group_arrays.append(group_array)
+        _set_code_editor_group_array_values(self, values)
+
+    @property
+    def values(self):
+        return _get_code_editor_group_array_values(self)
+
+    @values.setter
+    def values(self, values):
+        _get_code_editor_group_array_values(self)[:] = values
+
+
+_set_code_editor_group_array_values = CodeEditorGroupArray._values.__set__
+_get_code_editor_group_array_values = CodeEditorGroupArray._values.__get__
+del CodeEditorGroupArray._values
+
+
+def release_group_array(group_array, owner):
+    """Stop owner from using a GroupArray.
+
+    Once no clip uses it, each group gets its own values array back, with
+    the values it had.
+    """
+    groups, _, owners = group_array
+    owners.discard(owner)
+    if owners:
+        return
+    for group in groups:
+        if group.group_array is group_array:
+            group.group_array = None
+            group.bind_values(np.zeros(len(group.outputs)))
+
+
+# Subclasses of CodeEditorOutputGroup by channel names, and the slot
+# setters of their outputs.
+_CODE_EDITOR_GROUP_CLASSES = {}
+_CODE_EDITOR_GROUP_SETTERS = {}
+
+
+def code_editor_group_class(channel_names):
+    """Return the CodeEditorOutputGroup subclass for a group's channel names.
+
+    Names that are not valid attributes can still be used as Group["name"].
+    """
+    channel_names = tuple(
+        name
+        for name in channel_names
+        if name.isidentifier()
+        and not name.startswith("_")
+        and not hasattr(CodeEditorOutputGroup, name)
+    )
+    group_class = _CODE_EDITOR_GROUP_CLASSES.get(channel_names)
+    if group_class is None:
+        group_class = type(
+            "CodeEditorOutputGroup",
+            (CodeEditorOutputGroup,),
+            {
+                "__slots__": tuple(f"_{name}" for name in channel_names),
+                "valid_attributes": CodeEditorOutputGroup.valid_attributes
+                + channel_names,
+            },
+        )
+        setters = []
+        for name in channel_names:
+            slot = group_class.__dict__[f"_{name}"]
+            delattr(group_class, f"_{name}")
+            setattr(group_class, name, property(slot.__get__))
+            setters.append((name, slot.__set__))
+        _CODE_EDITOR_GROUP_CLASSES[channel_names] = group_class
+        _CODE_EDITOR_GROUP_SETTERS[group_class] = setters
+    return group_class
+
+
+def code_editor_channel(channel):
+    """Return the CodeEditorChannel used for a channel in clip code."""
+    if isinstance(channel, DmxOutputGroup):
+        return code_editor_group_class(channel.channel_names)(channel)
+    return CodeEditorChannel(channel)
 
 
 class CodeEditorException(Exception):
@@ -305,7 +490,7 @@ class SourceNode(Parameterized):
         self.input_type = None
         self.is_constant = True
 
-    def update(self, clip_beat):
+    def update(self, clip_beat, automations=None):
         pass
 
     @property
@@ -374,12 +559,20 @@ class AutomatableSourceNode(SourceNode):
         self.speed = 0
         self.last_beat = 0
         self.is_constant = False
+        # (generation, slot, function) given by AutomationBatch.gather()
+        self.automation_slot = (0, 0, None)
 
         self.history = [self.get()]*100
 
-    def update(self, clip_beat):
+    def update(self, clip_beat, automations=None):
+        """Update the value of the input.
+
+        clip_beat (float): The beat of the clip.
+        automations (AutomationBatch): The automations evaluated for this
+                                       tick, if any.
+        """
         self.history.pop(0)
-        self.history.append(self.get())
+        self.history.append(self.channel.get())
 
         if self.active_automation is None:
             return
@@ -390,7 +583,7 @@ class AutomatableSourceNode(SourceNode):
 
         if self.mode == "armed":
             if self.active_automation is not None:
-                value = self.active_automation.value(current_beat)
+                value = self.automation_value(current_beat, automations)
                 self.channel.set(value)
             if restarted:
                 self.mode = "recording"
@@ -403,13 +596,33 @@ class AutomatableSourceNode(SourceNode):
             self.channel.set(self.ext_channel.get())
         elif self.mode == "automation":
             if self.active_automation is not None:
-                value = self.active_automation.value(current_beat)
+                value = self.automation_value(current_beat, automations)
                 self.channel.set(value)
         else:  # manual
             self.channel.set(self.ext_channel.get())
 
         self.last_beat = current_beat
 
+    def automation_value(self, beat, automations=None):
+        """Return the value of the active automation at beat.
+
+        The value evaluated by automations is used when it was evaluated
+        for this input's automation at the same beat. Otherwise the input
+        is evaluated on its own and automations are gathered again.
+        """
+        automation = self.active_automation
+        if automations is not None and automation.f is not None:
+            generation, slot, f = self.automation_slot
+            if (
+                generation == automations.generation
+                and f is automation.f
+                and automations.beats[slot] == beat
+            ):
+                automations.reads += 1
+                return automations.values[slot]
+            automations.dirty = True
+        return automation.value(beat)
+
     def ext_get(self):
         return self.ext_channel.get()
 
@@ -508,11 +721,37 @@ class AutomatableSourceNode(SourceNode):
 
 
 class DmxOutput(Channel):
-    def __init__(self, dmx_address=1, name=""):
+    def __init__(self, dmx_address=1, name="", universe=0):
+        # The outputs of a DmxOutputGroup keep their value in the group's
+        # values array, see bind_value().
+        self._values = None
+        self._index = None
+        self._own_value = 0
         super().__init__(dtype="int", name=name or f"Dmx{dmx_address}")
         self.dmx_address = dmx_address
+        self.universe = universe
         self.history = [0] * 500
 
+    @property
+    def _value(self):
+        if self._values is None:
+            return self._own_value
+        return self._values.item(self._index)
+
+    @_value.setter
+    def _value(self, value):
+        if self._values is None:
+            self._own_value = value
+        else:
+            self._values[self._index] = value
+
+    def bind_value(self, values, index):
+        """Keep the value in values[index] from now on."""
+        value = self._value
+        self._values = values
+        self._index = index
+        self._value = value
+
     def record(self):
         self.history.pop(0)
         self.history.append(self.value)
@@ -522,6 +761,7 @@ class DmxOutput(Channel):
         data.update(
             {
                 "dmx_address": self.dmx_address,
+                "universe": self.universe,
             }
         )
         return data
@@ -529,23 +769,49 @@ class DmxOutput(Channel):
     def deserialize(self, data):
         super().deserialize(data)
         self.dmx_address = data["dmx_address"]
+        self.universe = data.get("universe", 0)
 
 
 class DmxOutputGroup(Identifier):
-    def __init__(self, channel_names=[], dmx_address=1, name="Group"):
+    def __init__(self, channel_names=[], dmx_address=1, name="Group", universe=0):
         super().__init__()
         self.name = name
         self.dmx_address = dmx_address
+        self.universe = universe
         self.outputs: DmxOutput = []
         self.channel_names = channel_names
         for i, channel_name in enumerate(channel_names):
             output_channel = DmxOutput()
             self.outputs.append(output_channel)
         self.update_starting_address(dmx_address)
+        self.update_universe(universe)
         self.update_name(name)
         self.map = {
             self.channel_names[i]: self.outputs[i] for i in range(len(self.outputs))
         }
+        # The values of the outputs, in order. Clip code can write to it as
+        # a whole, e.g. Group.values[:] = np.linspace(0, 255, n).
+        self.values = None
+        self.bind_values(np.zeros(len(self.outputs)))
+        # (groups, values, owning clips) of the GroupArray the values were
+        # moved to.
+        self.group_array = None
+
+    def bind_values(self, values):
+        """Keep the values of the outputs in values, a float array view."""
+        if self.values is not None:
+            values[:] = self.values
+        self.values = values
+        for i, output_channel in enumerate(self.outputs):
+            output_channel.bind_value(values, i)
+
+    def dmx_values(self):
+        """Return the DMX values of the outputs, as bytes.
+
+        Values are truncated like DmxOutput.get() does for a single output.
+        """
+        values = np.clip(np.nan_to_num(self.values), 0, 255)
+        return values.astype(np.uint8).tobytes()
 
     def record(self):
         for output in self.outputs:
@@ -556,6 +822,11 @@ class DmxOutputGroup(Identifier):
         for i, output_channel in enumerate(self.outputs):
             output_channel.dmx_address = i + address
 
+    def update_universe(self, universe):
+        self.universe = universe
+        for output_channel in self.outputs:
+            output_channel.universe = universe
+
     def update_name(self, name):
         self.name = name
         for i, output_channel in enumerate(self.outputs):
@@ -567,6 +838,7 @@ class DmxOutputGroup(Identifier):
             {
                 "name": self.name,
                 "dmx_address": self.dmx_address,
+                "universe": self.universe,
                 "channel_names": self.channel_names,
                 "outputs": [],
             }
@@ -580,6 +852,7 @@ class DmxOutputGroup(Identifier):
         super().deserialize(data)
         self.name = data["name"]
         self.dmx_address = data["dmx_address"]
+        self.universe = data.get("universe", 0)
         self.channel_names = data["channel_names"]
         for i, output_data in enumerate(data["outputs"]):
             self.outputs[i].deserialize(output_data)
@@ -738,7 +1011,7 @@ class ChannelAutomation(Identifier):
                 logger.warning(e)
                 v = 0
 
-        if np.isnan(v):
+        if math.isnan(v):
             v = 0
 
         if self.dtype == "bool":
@@ -795,12 +1068,10 @@ class ChannelAutomation(Identifier):
         self.reinterpolate()
 
     def reinterpolate(self):
-        self.f = scipy.interpolate.interp1d(
+        self.f = interpolation.make_interpolator(
             self.values_x,
             self.values_y,
             kind=self.interpolation,
-            assume_sorted=False,
-            bounds_error=False,
         )
 
     def set_length(self, new_length):
@@ -850,6 +1121,105 @@ class ChannelAutomation(Identifier):
         self.set_interpolation(data["interpolation"])
 
 
+class AutomationBatch:
+    """The active automations of every playing input, evaluated at once.
+
+    The playing inputs are only gathered again when one of them reads a
+    value that was not evaluated for it, e.g. after a clip started or an
+    automation changed, or when a slot was not read on the last tick, e.g.
+    after a clip stopped. Otherwise a tick costs a few NumPy operations
+    whatever the number of inputs, and each input reads its value from a
+    list by the slot it was given when it was gathered.
+    """
+
+    def __init__(self):
+        self.functions = interpolation.PiecewisePolynomialBatch()
+        # Incremented when the inputs are gathered, which invalidates the
+        # slots given before.
+        self.generation = 0
+        self.dirty = True
+        # The beat and the value of each slot, for the current tick.
+        self.beats = []
+        self.values = []
+        # Number of slots read on the current tick.
+        self.reads = 0
+        self._clip_factors = np.zeros(0)
+        self._input_factors = np.zeros(0)
+        self._lengths = np.zeros(0)
+        self._int_slots = np.zeros(0, dtype=int)
+        self._bool_slots = np.zeros(0, dtype=int)
+
+    def gather(self, tracks):
+        """Give a slot to every input that plays an automation."""
+        self.generation += 1
+        functions = []
+        clip_factors = []
+        input_factors = []
+        lengths = []
+        int_slots = []
+        bool_slots = []
+        for track in tracks:
+            for clip in track.clips:
+                if clip is None or not clip.playing:
+                    continue
+                for input_channel in clip.inputs:
+                    if input_channel.is_constant or input_channel.deleted:
+                        continue
+                    if input_channel.mode not in ("automation", "armed"):
+                        continue
+                    automation = input_channel.active_automation
+                    if automation is None or automation.f is None:
+                        continue
+                    slot = len(functions)
+                    input_channel.automation_slot = (
+                        self.generation,
+                        slot,
+                        automation.f,
+                    )
+                    functions.append(automation.f)
+                    clip_factors.append(2**clip.speed)
+                    input_factors.append(2**input_channel.speed)
+                    lengths.append(automation.length)
+                    if automation.dtype == "int":
+                        int_slots.append(slot)
+                    elif automation.dtype == "bool":
+                        bool_slots.append(slot)
+
+        self.functions.set_functions(functions)
+        self._clip_factors = np.array(clip_factors, dtype=float)
+        self._input_factors = np.array(input_factors, dtype=float)
+        self._lengths = np.array(lengths, dtype=float)
+        self._int_slots = np.array(int_slots, dtype=int)
+        self._bool_slots = np.array(bool_slots, dtype=int)
+        self.dirty = False
+
+    def update(self, beat, tracks):
+        """Evaluate every slot at the beat since the start."""
+        # Inputs that are no longer updated, like the inputs of a stopped
+        # clip, would otherwise be evaluated until the next gather.
+        if self.reads != len(self.values):
+            self.dirty = True
+        self.reads = 0
+        if self.dirty:
+            self.gather(tracks)
+
+        # Same operations as Clip.update() and AutomatableSourceNode.update()
+        # so that the beats match exactly.
+        beats = (beat * self._clip_factors) * self._input_factors % self._lengths
+        values = self.functions.evaluate(beats)
+
+        # Same conversions as ChannelAutomation.value().
+        values[np.isnan(values)] = 0
+        results = values.astype(object)
+        results[self._int_slots] = values[self._int_slots].astype(int).tolist()
+        results[self._bool_slots] = (
+            (values[self._bool_slots] > 0.5).astype(int).tolist()
+        )
+
+        self.beats = beats.tolist()
+        self.values = results.tolist()
+
+
 class ClipPreset(Identifier):
     def __init__(self, name=None, presets=None):
         super().__init__()
@@ -908,12 +1278,19 @@ class MultiClipPreset(Identifier):
         super().__init__()
         self.name = name
         self.presets = clip_presets or []
+        self.update_commands()
+
+    def update_commands(self):
+        """Build the commands run by execute(), call when presets change."""
+        self.commands = [
+            Command("set_clip", track.id, clip.id) for track, clip, _ in self.presets
+        ]
 
     def execute(self):
         start = time.time()
-        for clip_preset in self.presets:
+        for command, clip_preset in zip(self.commands, self.presets):
             track, clip, preset = clip_preset
-            STATE.execute(f"set_clip {track.id} {clip.id}")
+            STATE.run_command(command)
             preset.execute()
         STATE.start()
 
@@ -942,6 +1319,7 @@ class MultiClipPreset(Identifier):
                     UUID_DATABASE[preset_id],
                 )
             )
+        self.update_commands()
 
 
 class Trigger(Identifier):
@@ -960,26 +1338,34 @@ class Trigger(Identifier):
         self.type = type_
         self.event = event
         self.command = command
+        # Parsed once, rather than every time the Trigger fires.
+        self.action = STATE.compile_command(command)
 
-    def test(self, event):
-        return self.event == event
+    @property
+    def key(self):
+        return (self.type, self.event)
 
     def run(self):
         STATE.log.append(f"Trigger Fired! {self.name}: {self.event} {self.command}")
-        STATE.execute(self.command)
+        self.action()
 
 
 class TriggerManager:
     def __init__(self):
         self.triggers = []
+        # (type, event) -> Triggers
+        self.index = defaultdict(list)
 
     def add_trigger(self, trigger):
         self.triggers.append(trigger)
+        self.index[trigger.key].append(trigger)
 
     def fire_triggers(self, type_, event):
-        for trigger in self.triggers:
-            if type_ == trigger.type and trigger.test(event):
-                trigger.run()
+        triggers = self.index.get((type_, event))
+        if triggers is None:
+            return
+        for trigger in tuple(triggers):
+            trigger.run()
 
 
 class Code:
@@ -1001,8 +1387,9 @@ class Code:
                 if not self.exists():
                     Path(self.file_path_name).touch()
 
-                with open(self.file_path_name, "r") as f:
-                    self.compiled = compile(f.read(), self.file_path_name, "exec")
+                self.compiled = STATE.code_cache.compile(
+                    self.file_path_name, persist=not self.temp
+                )
         except Exception as e:
             STATE.log.append(e)
 
@@ -1015,7 +1402,7 @@ class Code:
             except Exception as e:
                 logger.warning("Failed to execute: %s", self.file_path_name)
                 logger.warning(e)
-                STATE.log.append(traceback.format_exc())
+                STATE.log.error(traceback.format_exc())
                 raise
 
     def _update_path(self):
@@ -1069,6 +1456,8 @@ class Clip(Identifier):
         self.main_code = Code(self.id + "_main")
         self._context = {}
         self._module_paths = []
+        # The GroupArrays created by the init code.
+        self.group_arrays = []
 
     def create_source(self, input_type):
         if input_type.startswith("osc_input"):
@@ -1090,13 +1479,13 @@ class Clip(Identifier):
         self.inputs.append(new_source)
         return new_source
 
-    def update(self, beat):
+    def update(self, beat, automations=None):
         if self.playing:
             self.time = beat * (2**self.speed)
             for channel in self.inputs:
                 if channel.deleted:
                     continue
-                channel.update(self.time)
+                channel.update(self.time, automations)
 
             try:
                 if self.global_clip:
@@ -1113,7 +1502,7 @@ class Clip(Identifier):
             - Adding all inputs to GlobalStorage
         """
         for input_ in self.inputs:
-            GlobalStorage.set(input_.name, CodeEditorChannel(input_))
+            GlobalStorage.set(input_.name, code_editor_channel(input_))
 
     def reload_code(self, module_paths=None):
         with self.code_lock:
@@ -1136,6 +1525,9 @@ class Clip(Identifier):
             self._module_paths = module_paths
 
             self._context["Global"] = GlobalStorage
+            self._context["GroupArray"] = functools.partial(
+                CodeEditorGroupArray, owner=self
+            )
 
             inputs = {
                 src.name: src
@@ -1147,10 +1539,12 @@ class Clip(Identifier):
                 if not output.deleted
             }
             for key, input_ in inputs.items():
-                self._context[key] = CodeEditorChannel(input_)
+                self._context[key] = code_editor_channel(input_)
             for key, output_ in outputs.items():
-                self._context[key] = CodeEditorChannel(output_)
+                self._context[key] = code_editor_channel(output_)
 
+            # The init code creates its GroupArrays again, maybe differently.
+            self.release_group_arrays()
             self.init_code.reload()
             try:
                 self.init_code.run(self._context)
@@ -1159,6 +1553,12 @@ class Clip(Identifier):
                 return
             self.main_code.reload()
 
+    def release_group_arrays(self):
+        """Stop using the GroupArrays created by the init code."""
+        for group_array in self.group_arrays:
+            release_group_array(group_array, self)
+        self.group_arrays = []
+
     def start(self, restart=True):
         if restart:
             self.time = 0
@@ -1318,7 +1718,7 @@ class Track(Identifier):
         self.sequence = None
         self.global_track = global_track
 
-    def update(self, beat):
+    def update_sequence(self, beat):
         if self.sequence is not None:
             seq_clip, preset = self.sequence.current_clip(beat)
             # Always execute the preset
@@ -1333,25 +1733,40 @@ class Track(Identifier):
                 else:
                     clip.stop()
 
+    def update(self, beat, profiler=None, automations=None):
+        """Update the clips and record the outputs.
+
+        beat (float): The beat since the start.
+        profiler (TickProfiler): Times every playing clip, if given.
+        automations (AutomationBatch): The automations evaluated for this
+                                       tick, if any.
+        """
         for clip in self.clips:
             if clip is not None:
-                clip.update(beat)
+                if profiler is not None and clip.playing:
+                    t0 = time.perf_counter_ns()
+                    clip.update(beat, automations)
+                    profiler.add_since(f"clip.{self.name}/{clip.name}", t0)
+                else:
+                    clip.update(beat, automations)
 
         for output in self.outputs:
             if output.deleted:
                 continue
             output.record()
 
-    def create_output(self, address):
-        new_output = DmxOutput(address)
+    def create_output(self, address, universe=0):
+        new_output = DmxOutput(address, universe=universe)
         self.outputs.append(new_output)
         for clip in self.clips:
             if clip is not None:
                 clip.outputs = self.outputs
         return new_output
 
-    def create_output_group(self, address, channel_names, group_name):
-        new_output_group = DmxOutputGroup(channel_names, address, name=group_name)
+    def create_output_group(self, address, channel_names, group_name, universe=0):
+        new_output_group = DmxOutputGroup(
+            channel_names, address, name=group_name, universe=universe
+        )
         self.outputs.append(new_output_group)
         for clip in self.clips:
             if clip is not None:
@@ -1440,11 +1855,38 @@ class IO:
     def __init__(self, args):
         self.args = args
         self.last_io_time = 0
+        self.output_worker = None
+        self.profile_name = f"io.{self.type}({self.args})"
         logger.debug("Created %s(%s)", self.type, self.args)
 
     def update(self, outputs):
+        """Send the outputs to the device from the calling thread."""
+        self.send(self.snapshot(outputs))
+
+    def snapshot(self, outputs):
+        """Return an immutable frame with everything send() needs from the outputs.
+
+        Called on the state thread, the frame can then be sent from any thread.
+        """
+        raise NotImplementedError
+
+    def send(self, frame):
         raise NotImplementedError
 
+    def publish(self, outputs):
+        """Send the outputs to the device from its own output thread."""
+        if self.output_worker is None:
+            self.output_worker = outputstage.OutputWorker(
+                self.profile_name, self.send, profiler=STATE.profiler
+            )
+            self.output_worker.start()
+        self.output_worker.publish(self.snapshot(outputs))
+
+    def stop_output_thread(self):
+        if self.output_worker is not None:
+            self.output_worker.stop()
+            self.output_worker = None
+
     def serialize(self):
         return {"type": self.type, "args": self.args}
 
@@ -1461,6 +1903,74 @@ class IO:
         self.last_io_time = time.time()
 
 
+def parse_universes(text):
+    """Return the set of universes in text. Example: "0-3,8" -> {0, 1, 2, 3, 8}"""
+    universes = set()
+    for tok in text.split(","):
+        tok = tok.strip()
+        if not tok:
+            continue
+        if "-" in tok:
+            first, last = tok.split("-")
+            universes.update(range(int(first), int(last) + 1))
+        else:
+            universes.add(int(tok))
+    return universes
+
+
+def dmx_channel_values(outputs, universes=None):
+    """Return (universe, dmx_address, value) of every DMX channel in outputs.
+
+    The channels of a DmxOutputGroup are a single entry whose value is the
+    bytes of its consecutive channels, starting at dmx_address.
+
+    outputs (list): DmxOutputs and DmxOutputGroups.
+    universes (set): Only include channels in these universes, if given.
+    """
+    values = []
+    for output_channel in outputs:
+        if output_channel.deleted:
+            continue
+
+        universe = output_channel.universe
+        if universes is not None and universe not in universes:
+            continue
+
+        if isinstance(output_channel, DmxOutputGroup):
+            dmx_address = output_channel.dmx_address
+            dmx_values = output_channel.dmx_values()
+            values.append(
+                (universe, dmx_address, dmx_values[: dmxio.DMX_SIZE + 1 - dmx_address])
+            )
+        else:
+            values.append(
+                (
+                    universe,
+                    output_channel.dmx_address,
+                    min(255, max(0, output_channel.get())),
+                )
+            )
+    return tuple(values)
+
+
+def parse_io_options(args):
+    """Split "<arg> key=value ..." into the argument and a dict of options.
+
+    The argument can contain spaces, e.g. a MIDI device name, the options
+    are the key=value words at the end.
+    """
+    arg = args.strip()
+    options = {}
+    while True:
+        rest, _, option = arg.rpartition(" ")
+        if not rest or "=" not in option:
+            break
+        key, value = option.split("=", 1)
+        options.setdefault(key, value)
+        arg = rest.rstrip()
+    return arg, options
+
+
 class EthernetDmxOutput(IO):
     nice_title = "Ethernet DMX"
     arg_template = "host:port"
@@ -1468,38 +1978,57 @@ class EthernetDmxOutput(IO):
 
     def __init__(self, args):
         super().__init__(args)
-        self.host, self.port = args.split(":")
+        # Optionally followed by the universes sent to this device and options,
+        # e.g. "host:port:0-3 keep_alive=4 sync=1"
+        address, options = parse_io_options(args)
+        self.host, self.port, *universes = address.split(":")
         self.port = int(self.port)
+        self.universes = parse_universes(universes[0]) if universes else None
+        self.keep_alive = float(options.get("keep_alive", dmxio.DEFAULT_KEEP_ALIVE))
+        # Send an ArtSync after the frames of each tick.
+        self.sync = options.get("sync", "0").lower() in ["1", "true", "yes"]
         self.dmx_connection = None
-        self.dmx_frame = [0] * 512
         self.connect()
 
-    def update(self, outputs):
-        for output_channel in outputs:
-            if output_channel.deleted:
-                continue
+    def snapshot(self, outputs):
+        return dmx_channel_values(outputs, self.universes)
 
-            channels = []
-            if isinstance(output_channel, DmxOutputGroup):
-                channels.extend(output_channel.outputs)
-            else:
-                channels = [output_channel]
+    def send(self, frame):
+        if self.dmx_connection is None:
+            return
 
-            for channel in channels:
-                self.dmx_frame[channel.dmx_address - 1] = min(
-                    255, max(0, int(round(channel.get())))
-                )
+        # Channels are written straight into the packets of the connection.
+        dmx_frames = {}
+        for universe, dmx_address, value in frame:
+            dmx_frame = dmx_frames.get(universe)
+            if dmx_frame is None:
+                try:
+                    dmx_frame = self.dmx_connection.get_dmx_buffer(universe)
+                except Exception as e:
+                    logger.warning(e)
+                    continue
+                dmx_frames[universe] = dmx_frame
+            if type(value) is bytes:
+                dmx_frame[dmx_address - 1 : dmx_address - 1 + len(value)] = value
+            else:
+                dmx_frame[dmx_address - 1] = value
 
         try:
-            self.dmx_connection.set_channels(1, self.dmx_frame)
-            self.dmx_connection.render()
-            self.update_io_time()
+            # Unchanged frames are only resent to keep the receivers alive.
+            # The frames that are sent go out as one burst, followed by a
+            # sync packet if enabled.
+            if self.dmx_connection.render_universes(
+                sorted(dmx_frames), changed_only=True
+            ):
+                self.update_io_time()
         except Exception as e:
             logger.warning(e)
 
     def connect(self):
         try:
-            self.dmx_connection = dmxio.DmxConnection((self.host, self.port))
+            self.dmx_connection = dmxio.DmxConnection(
+                (self.host, self.port), keep_alive=self.keep_alive, sync=self.sync
+            )
         except Exception as e:
             logger.warning(e)
 
@@ -1507,6 +2036,43 @@ class EthernetDmxOutput(IO):
         return self.dmx_connection is not None and self.dmx_connection.connected()
 
 
+class SacnOutput(EthernetDmxOutput):
+    nice_title = "sACN (E1.31)"
+    arg_template = "multicast"
+    type = "sacn"
+
+    def __init__(self, args):
+        IO.__init__(self, args)
+        # "multicast" or a unicast host, optionally followed by the universes
+        # sent to this device and options,
+        # e.g. "multicast:0-3 priority=150 interface=192.168.1.10 sync=7"
+        address, options = parse_io_options(args)
+        host, *universes = address.split(":")
+        self.host = None if host == "multicast" else host
+        self.universes = parse_universes(universes[0]) if universes else None
+        self.keep_alive = float(options.get("keep_alive", dmxio.DEFAULT_KEEP_ALIVE))
+        self.priority = int(options.get("priority", dmxio.SACN_DEFAULT_PRIORITY))
+        self.source_name = options.get("source", "CodeDMX")
+        self.interface = options.get("interface")
+        # Universe to send synchronization packets on after the frames of each tick.
+        self.sync_universe = int(options["sync"]) if "sync" in options else None
+        self.dmx_connection = None
+        self.connect()
+
+    def connect(self):
+        try:
+            self.dmx_connection = dmxio.SacnConnection(
+                self.host,
+                keep_alive=self.keep_alive,
+                priority=self.priority,
+                source_name=self.source_name,
+                interface=self.interface,
+                sync_universe=self.sync_universe,
+            )
+        except Exception as e:
+            logger.warning(e)
+
+
 class NodeDmxClientOutput(IO):
     nice_title = "Node DMX Client"
     arg_template = "host:port"
@@ -1517,27 +2083,24 @@ class NodeDmxClientOutput(IO):
         self.host, self.port = args.split(":")
         self.port = int(self.port)
         self.dmx_client = None
-        self.dmx_frame = [0] * 512
         self.connect()
 
-    def update(self, outputs):
-        for output_channel in outputs:
-            if output_channel.deleted:
-                continue
+    def snapshot(self, outputs):
+        # Node DMX only supports a single universe.
+        return dmx_channel_values(outputs, {0})
 
-            channels = []
-            if isinstance(output_channel, DmxOutputGroup):
-                channels.extend(output_channel.outputs)
-            else:
-                channels = [output_channel]
+    def send(self, frame):
+        if self.dmx_client is None:
+            return
 
-            for channel in channels:
-                self.dmx_frame[channel.dmx_address - 1] = min(
-                    255, max(0, int(round(channel.get())))
-                )
+        dmx_frame = self.dmx_client.get_dmx_buffer()
+        for _, dmx_address, value in frame:
+            if type(value) is bytes:
+                dmx_frame[dmx_address - 1 : dmx_address - 1 + len(value)] = value
+            else:
+                dmx_frame[dmx_address - 1] = value
 
         try:
-            self.dmx_client.set_channels(1, self.dmx_frame)
             self.dmx_client.send_frame()
             self.update_io_time()
         except Exception as e:
@@ -1553,6 +2116,76 @@ class NodeDmxClientOutput(IO):
         return self.dmx_client is not None and self.dmx_client.connected()
 
 
+class OscInputArray:
+    """Inputs mapped to an address pattern, e.g. a bank of faders.
+
+    The input a message is for is picked by the number in the part of its
+    address matched by the last wildcard part of the pattern, /fader/3 is
+    the third input of an array mapped to /fader/*.
+    """
+
+    def __init__(self, pattern, input_channels, start=1):
+        """Constructor.
+
+        pattern (str): OSC address pattern, e.g. /fader/*.
+        input_channels (list): The inputs, in order.
+        start (int): Number in the address of the first input.
+
+        Raises a ValueError if the pattern has no wildcards.
+        """
+        self.pattern = pattern
+        self.input_channels = list(input_channels)
+        self.start = start
+        self.index_part = oscroutes.index_part(pattern)
+        if self.index_part is None:
+            raise ValueError(f"OSC input array needs a pattern: {pattern}")
+
+    def input_channel(self, address):
+        index = oscroutes.address_index(address, self.index_part, self.start)
+        if index is None or not 0 <= index < len(self.input_channels):
+            return None
+        return self.input_channels[index]
+
+    def input_channels_matching(self, address_pattern):
+        """Return the inputs addressed by an address with wildcards.
+
+        E.g. /fader/* addresses every input of an array mapped to /fader/*
+        and /fader/[1-3] the first three.
+        """
+        parts = oscroutes.split_address(address_pattern)
+        mapped_parts = oscroutes.split_address(self.pattern)
+        if len(parts) != len(mapped_parts):
+            return []
+        for i, (part, mapped_part) in enumerate(zip(parts, mapped_parts)):
+            if i != self.index_part and not oscroutes.match_part(part, mapped_part):
+                return []
+
+        part = parts[self.index_part]
+        mapped_part = mapped_parts[self.index_part]
+        return [
+            input_channel
+            for i, input_channel in enumerate(self.input_channels)
+            if oscroutes.match_part(
+                part,
+                # The address part of the input, e.g. 3 for /fader/*.
+                mapped_part.replace("*", str(self.start + i), 1)
+                if "*" in mapped_part
+                else str(self.start + i),
+            )
+        ]
+
+    def serialize(self):
+        return {
+            "start": self.start,
+            "input_channels": [channel.id for channel in self.input_channels],
+        }
+
+
+# Resolved addresses kept by an OSC server. Controllers only send to a
+# fixed set of addresses, this only bounds the memory used for bad ones.
+MAX_CACHED_OSC_ADDRESSES = 4096
+
+
 class OscServerInput(IO):
     nice_title = "OSC Server"
     arg_template = "port"
@@ -1562,31 +2195,140 @@ class OscServerInput(IO):
         super().__init__(args)
         self.port = int(args)
         self.host = "0.0.0.0"
-        self.dispatcher = None
         self.server = None
-        self.thread = None
         self.channel_map = defaultdict(list)
+        self.channel_arrays = defaultdict(list)
+        # Address patterns -> input channels or OscInputArrays.
+        self.address_trie = oscroutes.OscAddressTrie()
+        # address -> ((input_channel, apply), ...), filled in by the server
+        # thread as messages arrive and replaced when the mappings change.
+        self.routes = {}
+        self.routes_lock = threading.Lock()
         self.connect()
 
     def map_channel(self, endpoint, input_channel):
-        def func(endpoint, value):
-            STATE.osc_log.append(f"Recieved: {endpoint} = {value}")
-            input_channel.ext_set(value)
-            if bool(value):
-                STATE.trigger_manager.fire_triggers("osc", (endpoint))
-            self.update_io_time()
-
-        self.dispatcher.map(endpoint, func)
+        """Map an address or address pattern to an input."""
+        with self.routes_lock:
+            try:
+                self.address_trie.add(endpoint, input_channel)
+            except ValueError as e:
+                STATE.osc_log.warning(e)
+                return
+            self.routes = {}
         self.channel_map[endpoint].append(input_channel)
         STATE.osc_log.append(f"Mapped {endpoint}")
 
     def umap(self, endpoint, input_channel):
-        self.dispatcher.umap(
-            endpoint, lambda endpoint, *args: print(f"Unmapped {endpoint} {args}")
-        )
+        with self.routes_lock:
+            self.address_trie.remove(endpoint, input_channel)
+            self.routes = {}
         self.channel_map[endpoint].remove(input_channel)
         STATE.osc_log.append(f"Unmapped {endpoint}")
 
+    def map_channels(self, pattern, input_channels, start=1):
+        """Map an address pattern to an array of inputs, see OscInputArray.
+
+        Returns the OscInputArray, or None if the pattern is invalid.
+        """
+        with self.routes_lock:
+            try:
+                input_array = OscInputArray(pattern, input_channels, start)
+                self.address_trie.add(pattern, input_array)
+            except ValueError as e:
+                STATE.osc_log.warning(e)
+                return None
+            self.channel_arrays[pattern].append(input_array)
+            self.routes = {}
+        STATE.osc_log.append(
+            f"Mapped {pattern} to {len(input_array.input_channels)} inputs"
+        )
+        return input_array
+
+    def umap_channels(self, pattern):
+        with self.routes_lock:
+            for input_array in self.channel_arrays.pop(pattern, []):
+                self.address_trie.remove(pattern, input_array)
+            self.routes = {}
+        STATE.osc_log.append(f"Unmapped {pattern}")
+
+    def routes_for(self, address):
+        """Return the (input_channel, apply) of the inputs mapped to an address."""
+        routes = self.routes.get(address)
+        if routes is not None:
+            return routes
+
+        with self.routes_lock:
+            try:
+                matches = self.address_trie.match(address)
+            except ValueError as e:
+                STATE.osc_log.warning(e)
+                matches = []
+            input_channels = []
+            if oscroutes.is_pattern(address):
+                # A pattern addresses every input of an array it matches.
+                for input_arrays in self.channel_arrays.values():
+                    for input_array in input_arrays:
+                        input_channels.extend(
+                            input_array.input_channels_matching(address)
+                        )
+            for _, value in matches:
+                if isinstance(value, OscInputArray):
+                    if oscroutes.is_pattern(address):
+                        continue
+                    input_channel = value.input_channel(address)
+                    if input_channel is None:
+                        continue
+                else:
+                    input_channel = value
+                input_channels.append(input_channel)
+            routes = tuple(
+                (input_channel, self._make_apply(address, input_channel))
+                for input_channel in input_channels
+            )
+            if len(self.routes) >= MAX_CACHED_OSC_ADDRESSES:
+                self.routes = {}
+            self.routes[address] = routes
+        return routes
+
+    def _make_apply(self, address, input_channel):
+        def apply(value):
+            STATE.osc_log.append(f"Recieved: {address} = {value}")
+            input_channel.ext_set(value)
+
+        return apply
+
+    def handle_message(self, address, params):
+        routes = self.routes_for(address)
+        if not routes or not params:
+            return
+        value = params[0]
+        # Only the latest value of the endpoint is applied on the next tick.
+        for input_channel, apply in routes:
+            STATE.input_events.push(("osc", address, input_channel), value, apply)
+        if bool(value):
+            STATE.input_events.push_trigger("osc", address)
+        self.update_io_time()
+
+    def handle_bundle(self, timetag, messages):
+        # The messages of a bundle are applied together, on the first tick
+        # after their timetag, and are not coalesced with each other.
+        updates = []
+        triggers = []
+        for address, params in messages:
+            routes = self.routes_for(address)
+            if not routes or not params:
+                continue
+            value = params[0]
+            for _, apply in routes:
+                updates.append((apply, value))
+            if bool(value):
+                triggers.append(("osc", address))
+        if not updates:
+            return
+        due_ns = time.perf_counter_ns() + int((timetag - time.time()) * 1e9)
+        STATE.input_events.push_batch(updates, triggers, due_ns)
+        self.update_io_time()
+
     def update(self, outputs):
         pass
 
@@ -1594,34 +2336,30 @@ class OscServerInput(IO):
         return f"OscServer"
 
     def connect(self):
+        if self.server is not None:
+            self.server.stop()
         try:
-            self.dispatcher = Dispatcher()
-            self.server = osc_server.ThreadingOSCUDPServer(
-                (self.host, self.port), self.dispatcher
+            self.server = oscserver.AsyncOscServer(self.host, self.port, self)
+            self.server.start()
+            STATE.osc_log.append(
+                f"OSCServer started on {self.server.server_address()}"
             )
-
-            def start_osc_listening_server():
-                STATE.osc_log.append(
-                    f"OSCServer started on {self.server.server_address}"
-                )
-                self.server.serve_forever()
-                STATE.osc_log.append("OSC Server Stopped")
-
-            self.thread = threading.Thread(target=start_osc_listening_server)
-            self.thread.daemon = True
-            self.thread.start()
         except Exception as e:
             logger.warning(e)
             STATE.osc_log.append(e)
 
     def connected(self):
-        return self.thread is not None and self.thread.is_alive()
+        return self.server is not None and self.server.running()
 
     def serialize(self):
         data = super().serialize()
         data["channel_map"] = {}
         for endpoint, input_channels in self.channel_map.items():
             data["channel_map"][endpoint] = [channel.id for channel in input_channels]
+        data["channel_arrays"] = {
+            pattern: [input_array.serialize() for input_array in input_arrays]
+            for pattern, input_arrays in self.channel_arrays.items()
+        }
         return data
 
     def deserialize(self, data):
@@ -1629,6 +2367,13 @@ class OscServerInput(IO):
         for endpoint, input_channels in data["channel_map"].items():
             for input_channel_id in input_channels:
                 self.map_channel(endpoint, UUID_DATABASE[input_channel_id])
+        for pattern, input_arrays in data.get("channel_arrays", {}).items():
+            for input_array in input_arrays:
+                self.map_channels(
+                    pattern,
+                    [UUID_DATABASE[id_] for id_ in input_array["input_channels"]],
+                    input_array["start"],
+                )
 
 
 # TODO: Map these when the real server is created.
@@ -1637,6 +2382,7 @@ class GhostOSCServerInput:
     tries to create a OSC node without a server defined."""
 
     channel_map = defaultdict(list)
+    channel_arrays = defaultdict(list)
 
     @staticmethod
     def map_channel(endpoint, input_channel):
@@ -1648,6 +2394,22 @@ class GhostOSCServerInput:
         GhostOSCServerInput.channel_map[endpoint].remove(input_channel)
         STATE.osc_log.append(f"Unmapped {endpoint}")
 
+    @staticmethod
+    def map_channels(pattern, input_channels, start=1):
+        try:
+            input_array = OscInputArray(pattern, input_channels, start)
+        except ValueError as e:
+            STATE.osc_log.warning(e)
+            return None
+        GhostOSCServerInput.channel_arrays[pattern].append(input_array)
+        STATE.osc_log.append(f"Saving {pattern}. No OSC Server defined.")
+        return input_array
+
+    @staticmethod
+    def umap_channels(pattern):
+        GhostOSCServerInput.channel_arrays.pop(pattern, None)
+        STATE.osc_log.append(f"Unmapped {pattern}")
+
 
 PITCH_FAKE_CONTROL = -1
 
@@ -1678,16 +2440,33 @@ class MidiInputDevice(IO):
         super().__init__(args)
         self.device_name = args
         self.port = None
-        self.channel_map = defaultdict(lambda: defaultdict(list))
 
         self.connect()
 
         if channel_map is not None:
             self.map_channels(channel_map)
 
+    @property
+    def channel_map(self):
+        """Read-only snapshot of the mappings of this device,
+        {midi channel: {note/control: (inputs, ...)}}.
+
+        Use map_channel() and unmap_channel() to change them.
+        """
+        channel_map = defaultdict(dict)
+        items = MIDI_INPUT_MAP.device_items(self)
+        for (_, midi_channel, note_control), channels in items:
+            channel_map[midi_channel][note_control] = channels
+        return MappingProxyType(
+            {
+                midi_channel: MappingProxyType(note_controls)
+                for midi_channel, note_controls in channel_map.items()
+            }
+        )
+
     def map_channel(self, midi_channel, note_control, channel):
-        global_unmap_midi(channel)
-        self.channel_map[midi_channel][note_control].append(channel)
+        # Also unmaps the channel from any other device.
+        MIDI_INPUT_MAP.map((self, midi_channel, note_control), channel)
 
         # There are two ways to update a mapping.
         # 1) Update the parameter in the gui, then trigger this map channel
@@ -1704,40 +2483,49 @@ class MidiInputDevice(IO):
                     self.map_channel(midi_channel, note_control, channel)
 
     def unmap_channel(self, channel):
-        for midi_channel, note_controls in self.channel_map.items():
-            for note_control, channels in note_controls.items():
-                for other_channel in channels:
-                    if channel == other_channel:
-                        self.channel_map[midi_channel][note_control].remove(channel)
-                        channel.get_parameter("device").value = ""
-                        channel.get_parameter("id").value = ""
-                        break
+        key = MIDI_INPUT_MAP.key(channel)
+        if key is not None and key[0] is self:
+            MIDI_INPUT_MAP.unmap(channel)
+            channel.get_parameter("device").value = ""
+            channel.get_parameter("id").value = ""
 
     def reset(self):
-        self.channel_map = defaultdict(lambda: defaultdict(list))
+        MIDI_INPUT_MAP.unmap_device(self)
 
     def callback(self, message):
         global LAST_MIDI_MESSAGE
+        if message.type in midisync.MESSAGE_TYPES:
+            if STATE.sync_source == self.device_name:
+                STATE.clock_sync.receive(message, time.perf_counter())
+                self.update_io_time()
+            return
+
         LAST_MIDI_MESSAGE = (self.device_name, message)
-        STATE.midi_log.append(f"Received {message} on {self.device_name}")
         midi_channel = message.channel
         note_control, value = midi_value(message)
-        if (
-            midi_channel in self.channel_map
-            and note_control in self.channel_map[midi_channel]
-        ):
-            for channel in self.channel_map[midi_channel][note_control]:
-                # TODO: Test this
-                # MIDI values are 0-127, scale to 255.
-                channel.ext_set(2*value)
+        # Only the latest message of each note/control is applied on the next tick.
+        STATE.input_events.push(
+            ("midi", self.device_name, midi_channel, note_control),
+            message,
+            self.apply,
+        )
 
         if value >= 127:
-            STATE.trigger_manager.fire_triggers(
+            STATE.input_events.push_trigger(
                 "midi", (self.device_name, midi_channel, note_control)
             )
 
         self.update_io_time()
 
+    def apply(self, message):
+        STATE.midi_log.append(f"Received {message} on {self.device_name}")
+        midi_channel = message.channel
+        note_control, value = midi_value(message)
+        for channel in MIDI_INPUT_MAP.get((self, midi_channel, note_control)):
+            # TODO: Test this
+            # MIDI values are 0-127, scale to 255.
+            channel.ext_set(2*value)
+
     def serialize(self):
         data = super().serialize()
         data["channel_map"] = {}
@@ -1768,67 +2556,193 @@ class MidiInputDevice(IO):
         return self.port is not None and not self.port.closed
 
 
+# Messages sent to a MIDI output per second. USB controllers with LED
+# feedback lag or drop messages when they receive more.
+DEFAULT_MIDI_OUTPUT_RATE = 1000
+
+# Messages that can be sent at once after the output was idle, in seconds
+# of the rate.
+MIDI_OUTPUT_BURST_S = 0.05
+
+# Placeholder of the value in a SysEx template.
+SYSEX_VALUE = "vv"
+
+
+def parse_sysex_template(template):
+    """Normalize a SysEx template, e.g. "F0 00 20 29 02 0D 03 00 0B vv F7".
+
+    The template is hex bytes with the value as SYSEX_VALUE. The F0 and F7
+    framing bytes are optional.
+    """
+    tokens = template.upper().split()
+    if tokens and tokens[0] == "F0":
+        tokens = tokens[1:]
+    if tokens and tokens[-1] == "F7":
+        tokens = tokens[:-1]
+    if tokens.count(SYSEX_VALUE.upper()) != 1:
+        raise ValueError(f"SysEx template needs one {SYSEX_VALUE}: {template}")
+    for token in tokens:
+        if token != SYSEX_VALUE.upper() and not 0 <= int(token, 16) <= 127:
+            raise ValueError(f"Invalid SysEx data byte {token}: {template}")
+    return " ".join(SYSEX_VALUE if t == SYSEX_VALUE.upper() else t for t in tokens)
+
+
+def midi_output_message(key, value):
+    """Return the message setting the (type, ...) key of a MIDI output to value."""
+    if key[0] == "note_on":
+        return mido.Message("note_on", channel=key[1], note=key[2], velocity=value)
+    elif key[0] == "control_change":
+        return mido.Message(
+            "control_change", channel=key[1], control=key[2], value=value
+        )
+    else:
+        data = [value if t == SYSEX_VALUE else int(t, 16) for t in key[1].split()]
+        return mido.Message("sysex", data=data)
+
+
 class MidiOutputDevice(IO):
+    """Sends the values of outputs as MIDI, e.g. for controller LEDs.
+
+    Outputs are mapped to a note (note_on), a control (control_change) or a
+    SysEx template. Only values that changed since they were last sent are
+    sent, at most max_rate messages per second. Values over the rate wait
+    for the next frame, taking turns so that every output gets through.
+    """
+
     nice_title = "MIDI (Output)"
     arg_template = "name"
     type = "midi_output"
 
     def __init__(self, args):
         super().__init__(args)
-        self.device_name = args
+        # The device name, optionally followed by options, e.g.
+        # "Launchpad Mini max_rate=200"
+        self.device_name, options = parse_io_options(args)
         self.port = None
+        # ("note_on"|"control_change", midi channel, note/control) or
+        # ("sysex", template) -> channel
         self.channel_map = {}
+        self.max_rate = float(options.get("max_rate", DEFAULT_MIDI_OUTPUT_RATE))
+        if self.max_rate <= 0:
+            raise ValueError(f"Invalid MIDI output rate {self.max_rate}")
+        self.sent_messages = 0
+        self.deferred_messages = 0
+        # Values as last sent to the device, by key.
+        self._sent_values = {}
+        self._tokens = 0
+        self._tokens_time = time.perf_counter()
+        # Position in the frame the next send starts at when over the rate.
+        self._cursor = 0
         self.connect()
 
-    def update(self, _):
+    def snapshot(self, _):
+        return tuple(
+            (key, clamp(int(channel.get()), 0, 127))
+            for key, channel in self.channel_map.items()
+        )
+
+    def send(self, frame):
         if self.port is None:
             return
 
-        for (midi_channel, note_control), channel in self.channel_map.items():
-            value = channel.get()
-            value = clamp(int(value), 0, 127)
-            self.port.send(
-                mido.Message(
-                    "note_on", channel=midi_channel, note=note_control, velocity=value
-                )
-            )
+        sent_values = self._sent_values
+        changed = [
+            i for i, (key, value) in enumerate(frame) if sent_values.get(key) != value
+        ]
+        if not changed:
+            return
 
-        self.update_io_time()
+        now = time.perf_counter()
+        self._tokens = min(
+            self._tokens + (now - self._tokens_time) * self.max_rate,
+            max(1.0, self.max_rate * MIDI_OUTPUT_BURST_S),
+        )
+        self._tokens_time = now
+        n = int(self._tokens)
+        if n < len(changed):
+            # Start after the last value sent, so every value gets its turn.
+            changed = [i for i in changed if i >= self._cursor] + [
+                i for i in changed if i < self._cursor
+            ]
+            self.deferred_messages += len(changed) - n
+            changed = changed[:n]
+
+        for i in changed:
+            key, value = frame[i]
+            self.port.send(midi_output_message(key, value))
+            sent_values[key] = value
+        self._tokens -= len(changed)
+        self.sent_messages += len(changed)
+        if changed:
+            self._cursor = changed[-1] + 1
+            self.update_io_time()
 
-    def map_channel(self, midi_channel, note_control, channel):
-        self.channel_map[(midi_channel, note_control)] = channel
+    def map_channel(
+        self, midi_channel, note_control, channel, message_type="note_on"
+    ):
+        """Map an output to a note (note_on) or control (control_change)."""
+        self.channel_map[(message_type, midi_channel, note_control)] = channel
+        MIDI_OUTPUT_MAP[channel].add(self)
+
+    def map_sysex(self, template, channel):
+        """Map an output to a SysEx template, see parse_sysex_template."""
+        self.channel_map[("sysex", parse_sysex_template(template))] = channel
+        MIDI_OUTPUT_MAP[channel].add(self)
 
     def unmap_channel(self, channel):
-        for (midi_channel, note_control), other_channel in self.channel_map.items():
+        """Unmap every key of an output on this device."""
+        for key, other_channel in tuple(self.channel_map.items()):
             if channel == other_channel:
-                del self.channel_map[(midi_channel, note_control)]
-                self.port.send(
-                    mido.Message(
-                        "note_off", channel=midi_channel, note=note_control, velocity=0
+                del self.channel_map[key]
+                self._sent_values.pop(key, None)
+                if key[0] == "note_on" and self.port is not None:
+                    self.port.send(
+                        mido.Message(
+                            "note_off", channel=key[1], note=key[2], velocity=0
+                        )
                     )
-                )
-                break
+        devices = MIDI_OUTPUT_MAP.get(channel)
+        if devices is not None:
+            devices.discard(self)
+            if not devices:
+                del MIDI_OUTPUT_MAP[channel]
 
     def serialize(self):
         data = super().serialize()
-        data["channel_map"] = {
-            f"{midi_channel}:{note_control}": channel.id
-            for (midi_channel, note_control), channel in self.channel_map.items()
-        }
+        data["channel_map"] = {}
+        for key, channel in self.channel_map.items():
+            if key[0] == "note_on":
+                text = f"{key[1]}:{key[2]}"
+            elif key[0] == "control_change":
+                text = f"{key[1]}:{key[2]}:control_change"
+            else:
+                text = f"sysex:{key[1]}"
+            data["channel_map"][text] = channel.id
+        data["max_rate"] = self.max_rate
         return data
 
     def deserialize(self, data):
         super().deserialize(data)
+        self.max_rate = data.get("max_rate", self.max_rate)
         for key, channel_id in data["channel_map"].items():
-            midi_channel, note_control = key.split(":")
+            channel = UUID_DATABASE[channel_id]
+            if key.startswith("sysex:"):
+                self.map_sysex(key[len("sysex:") :], channel)
+                continue
+            midi_channel, note_control, *message_type = key.split(":")
             self.map_channel(
-                int(midi_channel), int(note_control), UUID_DATABASE[channel_id]
+                int(midi_channel),
+                int(note_control),
+                channel,
+                message_type[0] if message_type else "note_on",
             )
 
     def connect(self):
         try:
             self.port = mido.open_output(self.device_name)
             self.port.reset()
+            # The device was reset, send every value again.
+            self._sent_values = {}
         except Exception as e:
             logger.warning(e)
 
@@ -1853,6 +2767,10 @@ def global_osc_server():
 LAST_MIDI_MESSAGE = None
 MIDI_INPUT_DEVICES = {}
 MIDI_OUTPUT_DEVICES = {}
+# (MidiInputDevice, midi channel, note/control) -> inputs, for every device.
+MIDI_INPUT_MAP = midimap.MidiMappingTable()
+# Output -> {MidiOutputDevice, ...} it is mapped on.
+MIDI_OUTPUT_MAP = defaultdict(set)
 
 
 def global_midi_control(device_name, in_out):
@@ -1863,12 +2781,133 @@ def global_midi_control(device_name, in_out):
 
 
 def global_unmap_midi(obj):
-    for midi_device in MIDI_INPUT_DEVICES.values():
-        midi_device.unmap_channel(obj)
-    for midi_device in MIDI_OUTPUT_DEVICES.values():
+    key = MIDI_INPUT_MAP.key(obj)
+    if key is not None:
+        key[0].unmap_channel(obj)
+    for midi_device in tuple(MIDI_OUTPUT_MAP.get(obj, ())):
         midi_device.unmap_channel(obj)
 
 
+class Command:
+    """A parsed ProgramState command.
+
+    Commands are usually parsed from their text form (see parse_command),
+    callers that run the same command often should parse it once and keep
+    the Command, e.g. Command("set_clip", track.id, clip.id).
+    """
+
+    def __init__(self, name, *args):
+        """Constructor.
+
+        name (str): The command, e.g. "play_clip".
+        args (any): The parsed arguments of the command.
+        """
+        self.name = name
+        self.args = args
+        self.text = None
+
+    def __str__(self):
+        if self.text is not None:
+            return self.text
+        return " ".join([self.name] + [str(arg) for arg in self.args])
+
+    def __repr__(self):
+        return f"Command({self.name!r}, {', '.join(repr(arg) for arg in self.args)})"
+
+
+def parse_ids(toks, full_command):
+    return tuple(toks[1:])
+
+
+def parse_json(toks, full_command):
+    return (json.loads(" ".join(toks[1::])),)
+
+
+def parse_slot(toks, full_command):
+    track_id, clip_i = toks[1].split(",")
+    return track_id, int(clip_i)
+
+
+def parse_create_output(toks, full_command):
+    universe = int(toks[3]) if len(toks) > 3 else 0
+    return toks[1], int(toks[2]), universe
+
+
+def parse_create_output_group(toks, full_command):
+    # <track> <address> <group name, can have spaces> <channels> [universe]
+    if len(toks) > 5 and toks[-1].isdigit():
+        universe = int(toks[-1])
+        toks = toks[:-1]
+    else:
+        universe = 0
+    channel_names = toks[-1].split(",")
+    group_name = " ".join(toks[3:-1])
+    return toks[1], int(toks[2]), group_name, channel_names, universe
+
+
+def parse_multi_clip_preset(toks, full_command):
+    slots = [
+        tuple(multi_clip_preset_id.split(":"))
+        for multi_clip_preset_id in toks[1].split(",")
+    ]
+    return slots, " ".join(toks[2:])
+
+
+def parse_add_automation_point(toks, full_command):
+    return toks[1], [float(x) for x in toks[2].split(",")]
+
+
+def parse_update_automation_point(toks, full_command):
+    return toks[1], toks[2], [float(x) for x in toks[3].split(",")]
+
+
+def parse_update_parameter(toks, full_command):
+    # resplit, the value can contain spaces.
+    toks = full_command.split(" ", 3)
+    value = toks[3] if len(toks) > 3 else None
+    return toks[1], int(toks[2]), value
+
+
+def parse_create_io(toks, full_command):
+    return int(toks[1]), toks[2], toks[3], " ".join(toks[4::])
+
+
+def parse_connect_io(toks, full_command):
+    return int(toks[1]), toks[2]
+
+
+def parse_sync_source(toks, full_command):
+    # Device names can contain spaces.
+    return (" ".join(toks[1:]) or None,)
+
+
+def parse_map_osc_array(toks, full_command):
+    return toks[1], int(toks[2]), toks[3].split(",")
+
+
+def parse_duplicate_clip(toks, full_command):
+    return int(toks[1]), int(toks[2]), toks[3]
+
+
+# Command name -> (parser, ProgramState method)
+COMMANDS = {}
+
+
+def command(name, parse=parse_ids):
+    """Register a ProgramState method as the handler of a command.
+
+    name (str): The command.
+    parse (function): Returns the handler's arguments from the tokens and
+                      text of the command.
+    """
+
+    def register(handler):
+        COMMANDS[name] = (parse, handler)
+        return handler
+
+    return register
+
+
 class ProgramState(Identifier):
     def __init__(self):
         global STATE
@@ -1897,13 +2936,32 @@ class ProgramState(Identifier):
         self.time_since_start_beat = 0
         self.time_since_start_s = 0
 
+        # Name of the MIDI input whose clock or MTC drives the beat, or None
+        # to follow the tempo.
+        self.sync_source = None
+        self.clock_sync = midisync.MidiClockSync()
+
         self.multi_clip_presets = []
 
         self.trigger_manager = TriggerManager()
 
-        self.log = []
-        self.osc_log = []
-        self.midi_log = []
+        # Events from the OSC and MIDI threads, applied at the start of each tick.
+        self.input_events = inputqueue.InputEventQueue()
+
+        self.automation_batch = AutomationBatch()
+
+        self.profiler = profiling.TickProfiler()
+
+        # Compiled clip code, only compiled again when the source changes.
+        self.code_cache = codecache.CodeCache()
+
+        # Send the outputs of each tick from a thread per device rather than
+        # from the state loop.
+        self.async_outputs = True
+
+        self.log = ringlog.RingLog("debug")
+        self.osc_log = ringlog.RingLog("osc")
+        self.midi_log = ringlog.RingLog("midi")
 
         self.id = "global"
 
@@ -1919,30 +2977,94 @@ class ProgramState(Identifier):
 
         # Start playing
         self.playing = True
-        self.play_time_start_s = time.time()
+        self.play_time_start_s = time.perf_counter()
 
     def stop(self):
         self.playing = False
 
+    def stop_output_threads(self):
+        """Stop the output thread of every output device, e.g. on exit."""
+        for io_output in self.io_outputs:
+            if io_output is not None:
+                io_output.stop_output_thread()
+
     def update(self):
+        profiler = self.profiler
+        # Section names are only formatted when they are recorded.
+        track_profiler = profiler if profiler.enabled else None
+        t0 = time.perf_counter_ns()
+        oldest_input_ns = self.process_input_events()
+        if oldest_input_ns is not None:
+            profiler.add_since("inputs", t0)
+
         if self.playing:
+            tick_start = t0 = time.perf_counter_ns()
+
             # Update timing
-            self.time_since_start_s = time.time() - self.play_time_start_s
-            self.time_since_start_beat = util.seconds_to_beats(
-                self.time_since_start_s, self.tempo
-            )
+            self.update_time(time.perf_counter())
+
+            # Update values. Inputs of clips that a sequence starts, or
+            # whose automation it changes, are evaluated on their own.
+            self.automation_batch.update(self.time_since_start_beat, self.tracks)
+            t0 = profiler.add_since("automations", t0)
 
-            # Update values
             for track in self.tracks:
-                track.update(self.time_since_start_beat)
+                track.update_sequence(self.time_since_start_beat)
+                track.update(
+                    self.time_since_start_beat,
+                    track_profiler,
+                    self.automation_batch,
+                )
+                if track_profiler is not None:
+                    t0 = profiler.add_since(f"track.{track.name}", t0)
 
             # Update DMX outputs
             all_track_outputs = []
             for track in self.tracks:
                 all_track_outputs.extend(track.outputs)
             for io_output in self.io_outputs:
-                if io_output is not None:
+                if io_output is None:
+                    continue
+                if self.async_outputs:
+                    io_output.publish(all_track_outputs)
+                else:
                     io_output.update(all_track_outputs)
+                t0 = profiler.add_since(io_output.profile_name, t0)
+
+            tick_end = profiler.add_since("tick", tick_start)
+            if oldest_input_ns is not None:
+                # From receiving the oldest input of the tick to its outputs
+                # being published.
+                profiler.add("input_latency", tick_end - oldest_input_ns)
+
+    def update_time(self, now):
+        beat = None
+        if self.sync_source is not None:
+            beat = self.clock_sync.beat(now, self.tempo)
+
+        if beat is None:
+            self.time_since_start_s = now - self.play_time_start_s
+            self.time_since_start_beat = util.seconds_to_beats(
+                self.time_since_start_s, self.tempo
+            )
+        else:
+            self.tempo = self.clock_sync.tempo(self.tempo)
+            self.time_since_start_beat = beat
+            self.time_since_start_s = util.beats_to_seconds(beat, self.tempo)
+            # Carry on from here if the sync source is lost.
+            self.play_time_start_s = now - self.time_since_start_s
+
+    def process_input_events(self):
+        """Apply the input events received since the last tick.
+
+        Returns the receive time of the oldest event, or None.
+        """
+        updates, triggers, oldest_ns = self.input_events.drain()
+        for apply, value in updates:
+            apply(value)
+        for type_, event in triggers:
+            self.trigger_manager.fire_triggers(type_, event)
+        return oldest_ns
 
     def serialize(self):
         data = {
@@ -1963,6 +3085,7 @@ class ProgramState(Identifier):
                 mcp.serialize() for mcp in self.multi_clip_presets
             ],
             "custom_module_paths": self.custom_module_paths,
+            "sync_source": self.sync_source,
         }
 
         return data
@@ -1975,6 +3098,7 @@ class ProgramState(Identifier):
         self.tempo = data["tempo"]
         self.project_name = data["project_name"]
         self.custom_module_paths = data.get("custom_module_paths", [])
+        self.sync_source = data.get("sync_source")
 
         for i, track_data in enumerate(data["tracks"]):
             new_track = Track()
@@ -2028,427 +3152,452 @@ class ProgramState(Identifier):
         new_obj.deserialize(new_data)
         return new_obj
 
-    def execute(self, full_command):
-        global MIDI_INPUT_DEVICES
-        global MIDI_OUTPUT_DEVICES
+    allowed_performance_commands = {
+        "toggle_play",
+        "set_active_automation",
+        "toggle_clip",
+        "play_clip",
+        "set_clip",
+        "update_parameter",
+        "set_sync_source",
+    }
 
-        allowed_performance_commands = [
-            "toggle_play",
-            "set_active_automation",
-            "toggle_clip",
-            "play_clip",
-            "set_clip",
-            "update_parameter",
-        ]
+    unlogged_commands = {"update_automation_point"}
 
+    def parse_command(self, full_command):
+        """Parse the text form of a command into a Command."""
         toks = full_command.split()
-        cmd = toks[0]
+        name = toks[0]
+        spec = COMMANDS.get(name)
+        args = spec[0](toks, full_command) if spec is not None else ()
+        command = Command(name, *args)
+        command.text = full_command
+        return command
+
+    def compile_command(self, full_command):
+        """Return a function that executes full_command, which is only parsed once."""
+        command = self.parse_command(full_command)
+        return lambda: self.run_command(command)
+
+    def execute(self, full_command):
+        return self.run_command(self.parse_command(full_command))
 
-        if cmd not in ["update_automation_point"]:
-            logger.info(full_command)
+    def run_command(self, command):
+        """Execute a Command."""
+        if command.name not in self.unlogged_commands:
+            logger.info("%s", command)
 
         if self.mode == "performance":
-            if cmd not in allowed_performance_commands:
+            if command.name not in self.allowed_performance_commands:
                 return Result(False)
 
-        if cmd == "toggle_play":
-            self.toggle_play()
-            return Result(True)
-        elif cmd == "toggle_clip":
-            track_id = toks[1]
-            clip_id = toks[2]
-            track = self.get_obj(track_id)
-            clip = self.get_obj(clip_id)
-            track.toggle(clip)
-            track.sequence = None
-            if clip.playing:
-                self.start()
-            return Result(True)
-
-        if cmd == "play_clip":
-            track_id = toks[1]
-            clip_id = toks[2]
-            track = self.get_obj(track_id)
-            clip = self.get_obj(clip_id)
-            track.sequence = None
-            track.start(clip)
+        spec = COMMANDS.get(command.name)
+        if spec is None:
+            return None
+        return spec[1](self, *command.args)
+
+    @command("toggle_play")
+    def cmd_toggle_play(self):
+        self.toggle_play()
+        return Result(True)
+
+    @command("toggle_clip")
+    def cmd_toggle_clip(self, track_id, clip_id):
+        track = self.get_obj(track_id)
+        clip = self.get_obj(clip_id)
+        track.toggle(clip)
+        track.sequence = None
+        if clip.playing:
             self.start()
-            return Result(True)
-
-        elif cmd == "set_clip":
-            track_id = toks[1]
-            clip_id = toks[2]
-            track = self.get_obj(track_id)
-            clip = self.get_obj(clip_id)
-            track.sequence = None
-            track.start(clip)
-            return Result(True)
-
-        elif cmd == "new_clip":
-            track_id, clip_i = toks[1].split(",")
-            clip_i = int(clip_i)
-            track = self.get_obj(track_id)
-            assert clip_i < len(track.clips)
-            track[clip_i] = Clip(f"Controller #{clip_i}", track.outputs, global_clip=track.global_track)
-            track[clip_i].reload_code(self.custom_module_paths)
-            return Result(True, track[clip_i])
-
-        elif cmd == "create_source":
-            clip_id = toks[1]
-            input_type = toks[2]
-            clip = self.get_obj(clip_id)
-            new_input_channel = clip.create_source(input_type)
-            return Result(True, new_input_channel)
-
-        elif cmd == "create_output":
-            track_id = toks[1]
-            track = self.get_obj(track_id)
-            address = int(toks[2])
-            new_output_channel = track.create_output(address)
-            return Result(True, new_output_channel)
-
-        elif cmd == "create_output_group":
-            track_id = toks[1]
-            track = self.get_obj(track_id)
-            address = int(toks[2])
-            group_name = toks[3]
-            channel_names = full_command.split(" ")[-1].split(",")
-            new_output_group = track.create_output_group(
-                address, channel_names, group_name
+        return Result(True)
+
+    @command("play_clip")
+    def cmd_play_clip(self, track_id, clip_id):
+        track = self.get_obj(track_id)
+        clip = self.get_obj(clip_id)
+        track.sequence = None
+        track.start(clip)
+        self.start()
+        return Result(True)
+
+    @command("set_clip")
+    def cmd_set_clip(self, track_id, clip_id):
+        track = self.get_obj(track_id)
+        clip = self.get_obj(clip_id)
+        track.sequence = None
+        track.start(clip)
+        return Result(True)
+
+    @command("new_clip", parse_slot)
+    def cmd_new_clip(self, track_id, clip_i):
+        track = self.get_obj(track_id)
+        assert clip_i < len(track.clips)
+        track[clip_i] = Clip(f"Controller #{clip_i}", track.outputs, global_clip=track.global_track)
+        track[clip_i].reload_code(self.custom_module_paths)
+        return Result(True, track[clip_i])
+
+    @command("create_source")
+    def cmd_create_source(self, clip_id, input_type):
+        clip = self.get_obj(clip_id)
+        new_input_channel = clip.create_source(input_type)
+        return Result(True, new_input_channel)
+
+    @command("create_output", parse_create_output)
+    def cmd_create_output(self, track_id, address, universe=0):
+        track = self.get_obj(track_id)
+        new_output_channel = track.create_output(address, universe)
+        return Result(True, new_output_channel)
+
+    @command("create_output_group", parse_create_output_group)
+    def cmd_create_output_group(
+        self, track_id, address, group_name, channel_names, universe=0
+    ):
+        track = self.get_obj(track_id)
+        new_output_group = track.create_output_group(
+            address, channel_names, group_name, universe
+        )
+        return Result(True, new_output_group)
+
+    @command("delete_node")
+    def cmd_delete_node(self, obj_id):
+        obj = self.get_obj(obj_id)
+        obj.deleted = True
+        return Result(True)
+
+    @command("delete_clip", parse_slot)
+    def cmd_delete_clip(self, track_id, clip_i):
+        track = self.get_obj(track_id)
+        assert clip_i < len(track.clips)
+        clip = track[clip_i]
+        clip.deleted = True
+        clip.release_group_arrays()
+        del track[clip_i]
+        return Result(True)
+
+    @command("delete")
+    def cmd_delete(self, obj_id):
+        obj = self.get_obj(obj_id)
+        if obj.deleted:
+            return Result(False)
+        obj.deleted = True
+        return Result(True)
+
+    @command("set_active_automation")
+    def cmd_set_active_automation(self, input_id, automation_id):
+        input_channel = self.get_obj(input_id)
+        automation = self.get_obj(automation_id)
+        input_channel.set_active_automation(automation)
+        return Result(True)
+
+    @command("add_automation")
+    def cmd_add_automation(self, input_id):
+        input_channel = self.get_obj(input_id)
+        return Result(True, input_channel.add_automation())
+
+    @command("add_clip_preset", parse_json)
+    def cmd_add_clip_preset(self, data):
+        preset_name = data["name"]
+        clip = self.get_obj(data["clip"])
+        all_preset_info = data["preset_info"]
+
+        presets = []
+        for preset_info in all_preset_info:
+            channel = self.get_obj(preset_info["channel"])
+            automation = (
+                preset_info["automation"]
+                if channel.is_constant
+                else self.get_obj(preset_info["automation"])
             )
-            return Result(True, new_output_group)
+            speed = preset_info["speed"]
+            presets.append((channel, automation, speed))
 
-        elif cmd == "delete_node":
-            obj_id = toks[1]
-            obj = self.get_obj(obj_id)
-            obj.deleted = True
-            return Result(True)
-
-        elif cmd == "delete_clip":
-            track_id, clip_i = toks[1].split(",")
-            clip_i = int(clip_i)
-            track = self.get_obj(track_id)
-            assert clip_i < len(track.clips)
-            clip = track[clip_i]
-            clip.deleted = True
-            del track[clip_i]
-            return Result(True)
-
-        elif cmd == "delete":
-            obj_id = toks[1]
-            obj = self.get_obj(obj_id)
-            if obj.deleted:
-                return Result(False)
-            obj.deleted = True
-            return Result(True)
-
-        elif cmd == "set_active_automation":
-            input_id = toks[1]
-            automation_id = toks[2]
-            input_channel = self.get_obj(input_id)
-            automation = self.get_obj(automation_id)
-            input_channel.set_active_automation(automation)
-            return Result(True)
-
-        elif cmd == "add_automation":
-            input_id = toks[1]
-            input_channel = self.get_obj(input_id)
-            return Result(True, input_channel.add_automation())
-
-        elif cmd == "add_clip_preset":
-            data_string = " ".join(toks[1::])
-            data = json.loads(data_string)
-
-            preset_name = data["name"]
-            clip = self.get_obj(data["clip"])
-            all_preset_info = data["preset_info"]
-
-            presets = []
-            for preset_info in all_preset_info:
-                channel = self.get_obj(preset_info["channel"])
-                automation = (
-                    preset_info["automation"]
-                    if channel.is_constant
-                    else self.get_obj(preset_info["automation"])
-                )
-                speed = preset_info["speed"]
-                presets.append((channel, automation, speed))
+        if data["preset_id"]:
+            preset = self.get_obj(data["preset_id"])
+            preset.update(preset_name, presets)
+        else:
+            preset = clip.add_preset(preset_name, presets)
 
-            if data["preset_id"]:
-                preset = self.get_obj(data["preset_id"])
-                preset.update(preset_name, presets)
-            else:
-                preset = clip.add_preset(preset_name, presets)
+        return Result(True, preset)
 
-            return Result(True, preset)
+    @command("add_multi_clip_preset", parse_multi_clip_preset)
+    def cmd_add_multi_clip_preset(self, slots, multi_clip_preset_name):
+        clip_presets = []
+        for track_id, clip_id, preset_id in slots:
+            track = self.get_obj(track_id)
+            clip = self.get_obj(clip_id)
+            preset = self.get_obj(preset_id)
+            clip_presets.append((track, clip, preset))
 
-        elif cmd == "add_multi_clip_preset":
-            all_multi_clip_preset_ids = toks[1].split(",")
-            multi_clip_preset_name = " ".join(toks[2:])
+        multi_clip_preset = MultiClipPreset(
+            multi_clip_preset_name, clip_presets=clip_presets
+        )
+        self.multi_clip_presets.append(multi_clip_preset)
+        return Result(True, multi_clip_preset)
+
+    @command("add_sequence", parse_json)
+    def cmd_add_sequence(self, data):
+        name = data["name"]
+        track = self.get_obj(data["track"])
+        sequence_data = data["sequence_info"]
+
+        sequence_info = []
+        for si in sequence_data:
+            clip_id, preset_id, duration = si
+            clip = self.get_obj(clip_id)
+            preset = self.get_obj(preset_id)
+            sequence_info.append((clip, preset, duration))
 
-            clip_presets = []
-            for multi_clip_preset_id in all_multi_clip_preset_ids:
-                track_id, clip_id, preset_id = multi_clip_preset_id.split(":")
-                track = self.get_obj(track_id)
-                clip = self.get_obj(clip_id)
-                preset = self.get_obj(preset_id)
-                clip_presets.append((track, clip, preset))
+        if data["sequence_id"]:
+            sequence = self.get_obj(data["sequence_id"])
+            sequence.update(name, sequence_info)
+        else:
+            track.sequences.append(Sequence(name, sequence_info))
+        return Result(True)
 
-            multi_clip_preset = MultiClipPreset(
-                multi_clip_preset_name, clip_presets=clip_presets
-            )
-            self.multi_clip_presets.append(multi_clip_preset)
-            return Result(True, multi_clip_preset)
-
-        elif cmd == "add_sequence":
-            data_string = " ".join(toks[1::])
-            data = json.loads(data_string)
-
-            name = data["name"]
-            track = self.get_obj(data["track"])
-            sequence_data = data["sequence_info"]
-
-            sequence_info = []
-            for si in sequence_data:
-                clip_id, preset_id, duration = si
-                clip = self.get_obj(clip_id)
-                preset = self.get_obj(preset_id)
-                sequence_info.append((clip, preset, duration))
-
-            if data["sequence_id"]:
-                sequence = self.get_obj(data["sequence_id"])
-                sequence.update(name, sequence_info)
-            else:
-                track.sequences.append(Sequence(name, sequence_info))
-            return Result(True)
+    @command("add_trigger", parse_json)
+    def cmd_add_trigger(self, data):
+        name = data["name"]
+        type_ = data["type"].lower()
+        command = data["command"]
 
-        elif cmd == "add_trigger":
-            data_string = " ".join(toks[1::])
-            data = json.loads(data_string)
+        if type_.lower() == "midi":
+            device_name, toks = data["event"].split(",")
+            channel, note_control = toks.split("/")
 
-            name = data["name"]
-            type_ = data["type"].lower()
-            command = data["command"]
+            device_name = device_name.strip()
+            channel = int(channel)
+            note_control = int(note_control)
 
-            if type_.lower() == "midi":
-                device_name, toks = data["event"].split(",")
-                channel, note_control = toks.split("/")
+            event = (device_name, channel, note_control)
 
-                device_name = device_name.strip()
-                channel = int(channel)
-                note_control = int(note_control)
+        else:
+            event = data["event"]
+
+        self.trigger_manager.add_trigger(Trigger(name, type_, event, command))
+        return Result(True)
+
+    @command("add_automation_point", parse_add_automation_point)
+    def cmd_add_automation_point(self, automation_id, values):
+        automation = self.get_obj(automation_id)
+        automation.add_point(Point(*values))
+        return Result(True)
+
+    @command("update_automation_point", parse_update_automation_point)
+    def cmd_update_automation_point(self, automation_id, point_id, values):
+        automation = self.get_obj(automation_id)
+        point = self.get_obj(point_id)
+        point.x = values[0]
+        point.y = values[1]
+        automation.reinterpolate()
+        return Result(True)
+
+    @command("update_parameter", parse_update_parameter)
+    def cmd_update_parameter(self, obj_id, param_i, value):
+        if value is None:
+            return
+        node = self.get_obj(obj_id)
+        result = node.update_parameter(param_i, value)
+        if isinstance(result, tuple):
+            return Result(result[0], result[1])
+        else:
+            return Result(result)
+
+    @command("delete_automation_point")
+    def cmd_delete_automation_point(self, automation_id, point_id):
+        automation = self.get_obj(automation_id)
+        point = self.get_obj(point_id)
+        point.deleted = True
+        automation.reinterpolate()
+        return Result(True)
+
+    @command("create_io", parse_create_io)
+    def cmd_create_io(self, index, input_output, io_type, args):
+        global MIDI_INPUT_DEVICES
+        global MIDI_OUTPUT_DEVICES
 
-                event = (device_name, channel, note_control)
+        IO_LIST = self.io_outputs if input_output == "outputs" else self.io_inputs
+        MIDI_LIST = (
+            MIDI_OUTPUT_DEVICES if input_output == "outputs" else MIDI_INPUT_DEVICES
+        )
+        if IO_LIST[index] is not None:
+            IO_LIST[index].stop_output_thread()
+        try:
+            if io_type == "ethernet_dmx":
+                IO_LIST[index] = EthernetDmxOutput(args)
+                return Result(True, IO_LIST[index])
+            elif io_type == "sacn":
+                IO_LIST[index] = SacnOutput(args)
+                return Result(True, IO_LIST[index])
+            elif io_type == "node_dmx_client":
+                IO_LIST[index] = NodeDmxClientOutput(args)
+                return Result(True, IO_LIST[index])
+            elif io_type == "osc_server":
+                # TODO: Only allow one
+                IO_LIST[index] = OscServerInput(args)
+                return Result(True, IO_LIST[index])
+            elif io_type == "midi_input":
+                IO_LIST[index] = MidiInputDevice(args)
+                MIDI_LIST[args] = IO_LIST[index]
+                return Result(True, IO_LIST[index])
+            elif io_type == "midi_output":
+                IO_LIST[index] = MidiOutputDevice(args)
+                MIDI_LIST[IO_LIST[index].device_name] = IO_LIST[index]
+                return Result(True, IO_LIST[index])
+        except Exception as e:
+            print(e)
+            return Result(False, None)
+
+    @command("connect_io", parse_connect_io)
+    def cmd_connect_io(self, index, input_output):
+        IO_LIST = self.io_outputs if input_output == "outputs" else self.io_inputs
+        io = IO_LIST[index]
+        io.connect()
+        return Result(True, io)
+
+    @command("duplicate_clip", parse_duplicate_clip)
+    def cmd_duplicate_clip(self, new_track_i, new_clip_i, clip_id):
+        new_track = self.tracks[int(new_track_i)]
+        old_clip = self.get_obj(clip_id)
+        new_clip = self.duplicate_obj(old_clip)
+        new_clip.init_code.save(old_clip.init_code.read())
+        new_clip.main_code.save(old_clip.main_code.read())
+        new_track[new_clip_i] = new_clip
+        return Result(True, new_clip)
+
+    @command("duplicate_node")
+    def cmd_duplicate_node(self, clip_id, obj_id):
+        clip = self.get_obj(clip_id)
+        obj = self.get_obj(obj_id)
+        new_obj = self.duplicate_obj(obj)
+        clip.inputs.append(new_obj)
+        new_obj.name = update_name(new_obj.name, [obj.name for obj in clip.inputs])
+        return Result(True, new_obj)
+
+    @command("double_automation")
+    def cmd_double_automation(self, automation_id):
+        automation = self.get_obj(automation_id)
+        old_length = automation.length
+        automation.length = old_length * 2
+        for point in tuple(automation.points):
+            if not point.deleted:
+                automation.add_point(Point(point.x + old_length, point.y))
+        return Result(True)
+
+    @command("duplicate_channel_preset")
+    def cmd_duplicate_channel_preset(self, input_id, automation_id):
+        input_channel = self.get_obj(input_id)
+        automation = self.get_obj(automation_id)
+        new_automation = self.duplicate_obj(automation)
+        input_channel.add_automation(new_automation)
+        return Result(True, new_automation)
+
+    @command("duplicate_clip_preset")
+    def cmd_duplicate_clip_preset(self, clip_id, preset_id):
+        clip = self.get_obj(clip_id)
+        preset = self.get_obj(preset_id)
+        new_preset = clip.add_preset(preset.name, preset.presets)
+        return Result(True, new_preset)
+
+    @command("copy_channel_to_clip")
+    def cmd_copy_channel_to_clip(self, clip_id, input_channel_id):
+        clip = self.get_obj(clip_id)
+        input_channel = self.get_obj(input_channel_id)
+        new_input_channel = self.duplicate_obj(input_channel)
+        clip.inputs.append(new_input_channel)
+        return Result(True, new_input_channel)
+
+    @command("midi_map")
+    def cmd_midi_map(self, obj_id):
+        obj = self.get_obj(obj_id)
+        device_name = obj.get_parameter("device").value
+        id_ = obj.get_parameter("id").value
+        midi_channel, note_control = id_.split("/")
+        global_midi_control(device_name, "in").map_channel(
+            int(midi_channel), int(note_control), obj
+        )
+        return Result(True)
+
+    @command("update_midi_device")
+    def cmd_update_midi_device(self, obj_id, new_device_name):
+        obj = self.get_obj(obj_id)
+        id_ = obj.get_parameter("id").value
+        midi_channel, note_control = id_.split("/")
+        global_midi_control(new_device_name, "in").map_channel(
+            int(midi_channel), int(note_control), obj
+        )
+        return Result(True)
 
-            else:
-                event = data["event"]
-
-            self.trigger_manager.add_trigger(Trigger(name, type_, event, command))
-            return Result(True)
-
-        elif cmd == "add_automation_point":
-            automation_id = toks[1]
-            values = [float(x) for x in toks[2].split(",")]
-            automation = self.get_obj(automation_id)
-            automation.add_point(Point(*values))
-            return Result(True)
-
-        elif cmd == "update_automation_point":
-            automation_id = toks[1]
-            point_id = toks[2]
-            values = [float(x) for x in toks[3].split(",")]
-            automation = self.get_obj(automation_id)
-            point = self.get_obj(point_id)
-            point.x = values[0]
-            point.y = values[1]
-            automation.reinterpolate()
-            return Result(True)
-
-        elif cmd == "update_parameter":
-            # resplit
-            toks = full_command.split(" ", 3)
-            obj_id = toks[1]
-            param_i = toks[2]
-            if len(toks) <= 3:
-                return
-            value = toks[3]
-            node = self.get_obj(obj_id)
-            result = node.update_parameter(int(param_i), value)
-            if isinstance(result, tuple):
-                return Result(result[0], result[1])
-            else:
-                return Result(result)
-
-        elif cmd == "delete_automation_point":
-            automation_id = toks[1]
-            point_id = toks[2]
-            automation = self.get_obj(automation_id)
-            point = self.get_obj(point_id)
-            point.deleted = True
-            automation.reinterpolate()
-            return Result(True)
-
-        elif cmd == "create_io":
-            index = int(toks[1])
-            input_output = toks[2]
-            io_type = toks[3]
-            args = toks[4::]
-            args = " ".join(args)
-            IO_LIST = self.io_outputs if input_output == "outputs" else self.io_inputs
-            MIDI_LIST = (
-                MIDI_OUTPUT_DEVICES if input_output == "outputs" else MIDI_INPUT_DEVICES
-            )
-            try:
-                if io_type == "ethernet_dmx":
-                    IO_LIST[index] = EthernetDmxOutput(args)
-                    return Result(True, IO_LIST[index])
-                elif io_type == "node_dmx_client":
-                    IO_LIST[index] = NodeDmxClientOutput(args)
-                    return Result(True, IO_LIST[index])
-                elif io_type == "osc_server":
-                    # TODO: Only allow one
-                    IO_LIST[index] = OscServerInput(args)
-                    return Result(True, IO_LIST[index])
-                elif io_type == "midi_input":
-                    IO_LIST[index] = MidiInputDevice(args)
-                    MIDI_LIST[args] = IO_LIST[index]
-                    return Result(True, IO_LIST[index])
-                elif io_type == "midi_output":
-                    IO_LIST[index] = MidiOutputDevice(args)
-                    MIDI_LIST[args] = IO_LIST[index]
-                    return Result(True, IO_LIST[index])
-            except Exception as e:
-                print(e)
-                return Result(False, None)
-
-        elif cmd == "connect_io":
-            index = int(toks[1])
-            input_output = toks[2]
-            IO_LIST = self.io_outputs if input_output == "outputs" else self.io_inputs
-            io = IO_LIST[index]
-            io.connect()
-            return Result(True, io)
-
-        elif cmd == "duplicate_clip":
-            new_track_i = int(toks[1])
-            new_clip_i = int(toks[2])
-            clip_id = toks[3]
-
-            new_track = self.tracks[int(new_track_i)]
-            old_clip = self.get_obj(clip_id)
-            new_clip = self.duplicate_obj(old_clip)
-            new_clip.init_code.save(old_clip.init_code.read())
-            new_clip.main_code.save(old_clip.main_code.read())
-            new_track[new_clip_i] = new_clip
-            return Result(True, new_clip)
-
-        elif cmd == "duplicate_node":
-            clip_id = toks[1]
-            obj_id = toks[2]
-            clip = self.get_obj(clip_id)
-            obj = self.get_obj(obj_id)
-            new_obj = self.duplicate_obj(obj)
-            clip.inputs.append(new_obj)
-            new_obj.name = update_name(new_obj.name, [obj.name for obj in clip.inputs])
-            return Result(True, new_obj)
-
-        elif cmd == "double_automation":
-            automation_id = toks[1]
-            automation = self.get_obj(automation_id)
-            old_length = automation.length
-            automation.length = old_length * 2
-            for point in tuple(automation.points):
-                if not point.deleted:
-                    automation.add_point(Point(point.x + old_length, point.y))
-            return Result(True)
-
-        elif cmd == "duplicate_channel_preset":
-            input_id = toks[1]
-            automation_id = toks[2]
-            input_channel = self.get_obj(input_id)
-            automation = self.get_obj(automation_id)
-            new_automation = self.duplicate_obj(automation)
-            input_channel.add_automation(new_automation)
-            return Result(True, new_automation)
-
-        elif cmd == "duplicate_clip_preset":
-            clip_id = toks[1]
-            preset_id = toks[2]
-            clip = self.get_obj(clip_id)
-            preset = self.get_obj(preset_id)
-            new_preset = clip.add_preset(preset.name, preset.presets)
-            return Result(True, new_preset)
-        
-        elif cmd == "copy_channel_to_clip":
-            clip_id = toks[1]
-            input_channel_id = toks[2]
-            clip = self.get_obj(clip_id)
-            input_channel = self.get_obj(input_channel_id)
-            new_input_channel = self.duplicate_obj(input_channel)
-            clip.inputs.append(new_input_channel)
-            return Result(True, new_input_channel)
-
-        elif cmd == "midi_map":
-            obj_id = toks[1]
-            obj = self.get_obj(obj_id)
-            device_name = obj.get_parameter("device").value
-            id_ = obj.get_parameter("id").value
-            midi_channel, note_control = id_.split("/")
-            global_midi_control(device_name, "in").map_channel(
-                int(midi_channel), int(note_control), obj
-            )
-            return Result(True)
-
-        elif cmd == "update_midi_device":
-            obj_id = toks[1]
-            new_device_name = toks[2]
-            obj = self.get_obj(obj_id)
-            id_ = obj.get_parameter("id").value
-            midi_channel, note_control = id_.split("/")
-            global_midi_control(new_device_name, "in").map_channel(
-                int(midi_channel), int(note_control), obj
-            )
-            return Result(True)
+    @command("unmap_midi")
+    def cmd_unmap_midi(self, obj_id):
+        obj = self.get_obj(obj_id)
+        global_unmap_midi(obj)
+        return Result(True)
 
-        elif cmd == "unmap_midi":
-            obj_id = toks[1]
-            obj = self.get_obj(obj_id)
-            global_unmap_midi(obj)
-            return Result(True)
+    @command("map_midi_sysex", parse_json)
+    def cmd_map_midi_sysex(self, data):
+        """Map an output to a SysEx template of a MIDI output device.
 
-        elif cmd == "remap_midi_device":
-            data_string = " ".join(toks[1::])
-            data = json.loads(data_string)
+        data (dict): {"device": device name, "output": output id,
+                      "template": SysEx template, see parse_sysex_template}
+        """
+        device = global_midi_control(data["device"], "out")
+        if device is None:
+            return Result(False)
+        try:
+            device.map_sysex(data["template"], self.get_obj(data["output"]))
+        except ValueError as e:
+            logger.warning(e)
+            return Result(False)
+        return Result(True)
+
+    @command("map_osc_array", parse_map_osc_array)
+    def cmd_map_osc_array(self, pattern, start, input_ids):
+        input_channels = [self.get_obj(input_id) for input_id in input_ids]
+        input_array = global_osc_server().map_channels(pattern, input_channels, start)
+        return Result(input_array is not None, input_array)
+
+    @command("unmap_osc_array")
+    def cmd_unmap_osc_array(self, pattern):
+        global_osc_server().umap_channels(pattern)
+        return Result(True)
+
+    @command("set_sync_source", parse_sync_source)
+    def cmd_set_sync_source(self, device_name):
+        self.sync_source = device_name
+        self.clock_sync.reset()
+        return Result(True)
+
+    @command("remap_midi_device", parse_json)
+    def cmd_remap_midi_device(self, data):
+        global MIDI_INPUT_DEVICES
 
-            old_device_index = data["index"]
-            old_device = self.io_inputs[old_device_index]
-            new_device_name = data["new_device_name"]
+        old_device_index = data["index"]
+        old_device = self.io_inputs[old_device_index]
+        new_device_name = data["new_device_name"]
 
-            new_device = MidiInputDevice(
-                new_device_name, channel_map=old_device.channel_map
-            )
-            self.io_inputs[old_device_index] = new_device
-            MIDI_INPUT_DEVICES[new_device_name] = new_device
+        new_device = MidiInputDevice(
+            new_device_name, channel_map=old_device.channel_map
+        )
+        self.io_inputs[old_device_index] = new_device
+        MIDI_INPUT_DEVICES[new_device_name] = new_device
 
-            del MIDI_INPUT_DEVICES[old_device.device_name]
-            old_device.reset()
+        del MIDI_INPUT_DEVICES[old_device.device_name]
+        old_device.reset()
 
-            return Result(True, new_device)
+        return Result(True, new_device)
 
-        elif cmd == "load_custom_modules":
-            data_string = " ".join(toks[1::])
-            data = json.loads(data_string)
+    @command("load_custom_modules", parse_json)
+    def cmd_load_custom_modules(self, data):
+        modules = data["module_paths"]
+        for module_path in modules:
+            self.custom_module_paths.append(module_path)
 
-            modules = data["module_paths"]
-            for module_path in modules:
-                self.custom_module_paths.append(module_path)
+        for track in self.tracks:
+            for clip in track.clips:
+                if util.valid(clip):
+                    clip.reload_code(self.custom_module_paths)
 
-            for track in self.tracks:
-                for clip in track.clips:
-                    if util.valid(clip):
-                        clip.reload_code(self.custom_module_paths)
-            
-            return Result(True)
+        return Result(True)
 
     def get_obj(self, id_):
         return UUID_DATABASE[id_]
@@ -2467,6 +3616,7 @@ class Result:
 
 IO_TYPES = {
     "ethernet_dmx": EthernetDmxOutput,
+    "sacn": SacnOutput,
     "node_dmx_client": NodeDmxClientOutput,
     "osc_server": OscServerInput,
     "midi_input": MidiInputDevice,
@@ -2479,6 +3629,7 @@ ALL_INPUT_TYPES = [
 ]
 ALL_OUTPUT_TYPES = [
     EthernetDmxOutput,
+    SacnOutput,
     NodeDmxClientOutput,
     MidiOutputDevice,
 ]
@@ -2486,9 +3637,3 @@ ALL_OUTPUT_TYPES = [
 STATE = None
 GlobalStorage = GlobalCodeStorage()
 Global = GlobalStorage
-
-# Weird hack.
-# Without this, the program will hang for several seconds
-# when first adding a source node, because reinterpolate()
-# will be called. Call first here instead.
-scipy.interpolate.interp1d([0, 0], [1, 1])
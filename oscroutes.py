@@ -0,0 +1,230 @@
+"""Routing of OSC addresses to the patterns they were mapped with.
+
+Mapped address patterns are compiled into a trie with one level per
+address part. Plain parts are found with a dict lookup and each level
+only tests the distinct wildcard parts mapped at that level, so matching
+an address costs O(address depth) however many addresses are mapped.
+
+Patterns use the OSC wildcards within a part:
+
+    *         Any sequence of characters, e.g. /fader/*
+    ?         Any single character
+    [abc]     Any character in the list, ranges like [0-9] are allowed
+    [!abc]    Any character not in the list
+    {foo,bar} Any of the comma separated strings
+
+Incoming addresses can use the same wildcards, they then address every
+mapped address they match. A mapped pattern is only addressed by an
+incoming pattern that matches it literally, e.g. /fader/* by /fader/*
+or /*/*, but not by /fader/1.
+
+The trie is modified from the state loop and read from the OSC server
+thread. Nodes are never modified in place in a way that could break a
+reader: children are added to dicts and wildcard lists are replaced.
+"""
+import functools
+import re
+
+_NUMBER = re.compile(r"\d+")
+_WILDCARD_CHARACTERS = set("*?[]{}")
+
+
+def is_pattern(address):
+    """Return True if the address contains OSC wildcards."""
+    return any(c in _WILDCARD_CHARACTERS for c in address)
+
+
+def split_address(address):
+    if not address.startswith("/"):
+        raise ValueError(f"OSC address must start with '/': {address}")
+    return address[1:].split("/")
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_part(part):
+    """Return a compiled regex matching an address part with wildcards."""
+    regex = []
+    i = 0
+    while i < len(part):
+        c = part[i]
+        if c == "*":
+            regex.append(".*")
+        elif c == "?":
+            regex.append(".")
+        elif c == "[":
+            end = part.find("]", i)
+            if end == -1:
+                raise ValueError(f"Unterminated '[' in OSC address part: {part}")
+            chars = part[i + 1 : end]
+            negate = chars.startswith("!")
+            if negate:
+                chars = chars[1:]
+            chars = re.escape(chars).replace("\\-", "-")
+            regex.append(f"[{'^' if negate else ''}{chars}]")
+            i = end
+        elif c == "{":
+            end = part.find("}", i)
+            if end == -1:
+                raise ValueError(f"Unterminated '{{' in OSC address part: {part}")
+            choices = part[i + 1 : end].split(",")
+            regex.append("(?:" + "|".join(re.escape(s) for s in choices) + ")")
+            i = end
+        else:
+            regex.append(re.escape(c))
+        i += 1
+    return re.compile("".join(regex))
+
+
+def match_part(part, mapped_part):
+    """Return True if a part of an incoming address matches a mapped part.
+
+    Either can have wildcards, an incoming part with wildcards is matched
+    against the mapped part literally.
+    """
+    if is_pattern(part):
+        return compile_part(part).fullmatch(mapped_part) is not None
+    if is_pattern(mapped_part):
+        return compile_part(mapped_part).fullmatch(part) is not None
+    return part == mapped_part
+
+
+def index_part(pattern):
+    """Return the position of the last part of a pattern with wildcards, or None."""
+    parts = split_address(pattern)
+    for i in reversed(range(len(parts))):
+        if is_pattern(parts[i]):
+            return i
+    return None
+
+
+def address_index(address, part, start=1):
+    """Return the last number in one part of the address minus start, or None.
+
+    Used to pick the input of an array mapped with a pattern, part being
+    the position of the part the pattern's wildcard matched (see
+    index_part). E.g. /fader/12 is the 12th input of an array mapped to
+    /fader/* with start=1, while /bank2/fader/x has no number in that part.
+    """
+    parts = split_address(address)
+    if part >= len(parts):
+        return None
+    numbers = _NUMBER.findall(parts[part])
+    if not numbers:
+        return None
+    return int(numbers[-1]) - start
+
+
+class _Node:
+    def __init__(self):
+        # part -> _Node
+        self.children = {}
+        # ((part, regex, _Node), ...) of the wildcard parts.
+        self.wildcards = ()
+        # ((pattern, value), ...) of the patterns ending here.
+        self.values = ()
+
+    def child(self, part):
+        node = self.children.get(part)
+        if node is None:
+            for wildcard_part, _, wildcard_node in self.wildcards:
+                if wildcard_part == part:
+                    return wildcard_node
+            node = _Node()
+            if is_pattern(part):
+                self.wildcards = self.wildcards + ((part, compile_part(part), node),)
+            else:
+                self.children[part] = node
+        return node
+
+    def empty(self):
+        return not (self.children or self.wildcards or self.values)
+
+
+class OscAddressTrie:
+    """Maps OSC address patterns to values."""
+
+    def __init__(self):
+        self.root = _Node()
+
+    def add(self, pattern, value):
+        """Map pattern to value. A pattern can be mapped to several values.
+
+        Raises a ValueError if the pattern is invalid.
+        """
+        parts = split_address(pattern)
+        for part in parts:
+            if is_pattern(part):
+                compile_part(part)
+        node = self.root
+        for part in parts:
+            node = node.child(part)
+        node.values = node.values + ((pattern, value),)
+
+    def remove(self, pattern, value):
+        """Remove one mapping of pattern to value. Returns False if there was none."""
+        path = [self.root]
+        for part in split_address(pattern):
+            node = path[-1]
+            next_node = node.children.get(part)
+            if next_node is None:
+                for wildcard_part, _, wildcard_node in node.wildcards:
+                    if wildcard_part == part:
+                        next_node = wildcard_node
+                        break
+                else:
+                    return False
+            path.append(next_node)
+
+        node = path[-1]
+        for i, item in enumerate(node.values):
+            if item[1] is value:
+                node.values = node.values[:i] + node.values[i + 1 :]
+                break
+        else:
+            return False
+
+        # Prune the nodes that no longer lead to a mapping.
+        parts = split_address(pattern)
+        for parent, part, node in reversed(list(zip(path, parts, path[1:]))):
+            if not node.empty():
+                break
+            if part in parent.children:
+                del parent.children[part]
+            else:
+                parent.wildcards = tuple(
+                    wildcard for wildcard in parent.wildcards if wildcard[0] != part
+                )
+        return True
+
+    def match(self, address):
+        """Return the (pattern, value) of every pattern matching the address.
+
+        The address can have wildcards, raises a ValueError if they are
+        invalid.
+        """
+        nodes = [self.root]
+        for part in split_address(address):
+            next_nodes = []
+            if is_pattern(part):
+                # Rare, every child of the level is tested.
+                part_regex = compile_part(part)
+                for node in nodes:
+                    for child_part, child in node.children.items():
+                        if part_regex.fullmatch(child_part):
+                            next_nodes.append(child)
+                    for wildcard_part, _, wildcard_node in node.wildcards:
+                        if part_regex.fullmatch(wildcard_part):
+                            next_nodes.append(wildcard_node)
+            else:
+                for node in nodes:
+                    child = node.children.get(part)
+                    if child is not None:
+                        next_nodes.append(child)
+                    for _, regex, wildcard_node in node.wildcards:
+                        if regex.fullmatch(part):
+                            next_nodes.append(wildcard_node)
+            if not next_nodes:
+                return []
+            nodes = next_nodes
+
+        return [item for node in nodes for item in node.values]
@@ -0,0 +1,138 @@
+"""OSC over UDP served from a single asyncio event loop.
+
+Every AsyncOscServer shares one event loop running on one daemon thread,
+so any number of ports can be served without a thread per server or per
+packet. Datagrams are parsed on the loop thread and handed to a handler;
+the messages of a bundle are handed over together with their timetag.
+"""
+import asyncio
+import itertools
+import logging
+import threading
+
+from pythonosc import osc_bundle
+from pythonosc import osc_packet
+
+logger = logging.getLogger(__name__)
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def event_loop():
+    """Return the event loop of the OSC servers, starting it if needed."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=_loop.run_forever, name="osc_server", daemon=True
+            )
+            thread.start()
+    return _loop
+
+
+class _OscProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.closed = asyncio.get_running_loop().create_future()
+
+    def connection_lost(self, exc):
+        self.closed.set_result(True)
+
+    def datagram_received(self, data, addr):
+        self.server.received += 1
+        try:
+            packet = osc_packet.OscPacket(data)
+        except osc_packet.ParseError as e:
+            self.server.errors += 1
+            logger.debug("Invalid OSC packet from %s: %s", addr, e)
+            return
+
+        handler = self.server.handler
+        try:
+            if not osc_bundle.OscBundle.dgram_is_bundle(data):
+                for timed_message in packet.messages:
+                    message = timed_message.message
+                    handler.handle_message(message.address, message.params)
+                return
+
+            # Messages are sorted by time, nested bundles can have their own.
+            for timetag, timed_messages in itertools.groupby(
+                packet.messages, key=lambda timed_message: timed_message.time
+            ):
+                handler.handle_bundle(
+                    timetag,
+                    [
+                        (timed_message.message.address, timed_message.message.params)
+                        for timed_message in timed_messages
+                    ],
+                )
+        except Exception as e:
+            self.server.errors += 1
+            logger.warning("OSC handler failed on %s: %s", self.server, e)
+
+    def error_received(self, exc):
+        logger.warning("%s: %s", self.server, exc)
+
+
+class AsyncOscServer:
+    """Listens for OSC packets on one UDP port."""
+
+    def __init__(self, host, port, handler):
+        """Constructor.
+
+        host (str): Address to bind to, e.g. "0.0.0.0".
+        port (int): UDP port to bind to.
+        handler (object): Receives the messages on the event loop thread,
+                          must not block. Its handle_message(address,
+                          params) is called for each message not sent in
+                          a bundle and handle_bundle(timetag, messages)
+                          with the (address, params) of the messages of a
+                          bundle that share a timetag. The timetag is in
+                          seconds since the epoch, immediate and late
+                          bundles have the time they were received.
+        """
+        self.host = host
+        self.port = port
+        self.handler = handler
+        self.received = 0
+        self.errors = 0
+        self.transport = None
+        self._protocol = None
+
+    def start(self, timeout=5.0):
+        """Bind the port. Raises an OSError if the port can not be bound."""
+        future = asyncio.run_coroutine_threadsafe(self._start(), event_loop())
+        self.transport, self._protocol = future.result(timeout)
+
+    async def _start(self):
+        return await asyncio.get_running_loop().create_datagram_endpoint(
+            lambda: _OscProtocol(self), local_addr=(self.host, self.port)
+        )
+
+    def stop(self, timeout=1.0):
+        """Close the port, waits until it can be bound again."""
+        if self.transport is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(
+            self._stop(self.transport, self._protocol), event_loop()
+        )
+        self.transport = None
+        self._protocol = None
+        future.result(timeout)
+
+    async def _stop(self, transport, protocol):
+        transport.close()
+        await protocol.closed
+
+    def running(self):
+        return self.transport is not None and not self.transport.is_closing()
+
+    def server_address(self):
+        if self.transport is None:
+            return None
+        return self.transport.get_extra_info("sockname")
+
+    def __str__(self):
+        return f"AsyncOscServer({self.host}:{self.port})"
@@ -0,0 +1,76 @@
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Frames waiting to be sent by a device. A frame holds the complete output
+# state, so once a newer one is waiting the older ones are stale.
+DEFAULT_MAX_PENDING = 1
+
+
+class OutputWorker:
+    """Sends the frames of one output device from its own thread.
+
+    The state loop publishes an immutable frame every tick and moves on,
+    a slow or blocked device only delays its own frames. When the device
+    falls behind the oldest pending frame is dropped.
+    """
+
+    def __init__(self, name, send, max_pending=DEFAULT_MAX_PENDING, profiler=None):
+        """Constructor.
+
+        name (str): Name of the thread, for debugging.
+        send (function): Called with each frame on the output thread.
+        max_pending (int): Number of frames that can wait to be sent.
+        profiler (TickProfiler): If given, records the duration of each send
+                                 as "<name>.send".
+        """
+        self.name = name
+        self.send = send
+        self.profiler = profiler
+        self.sent_frames = 0
+        self.dropped_frames = 0
+        self.done = False
+        self._pending = collections.deque(maxlen=max_pending)
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout=1.0):
+        """Stop the thread. Frames that have not been sent are discarded."""
+        with self._condition:
+            self.done = True
+            self._pending.clear()
+            self._condition.notify()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def publish(self, frame):
+        """Queue a frame to be sent. Never blocks on the device."""
+        with self._condition:
+            if len(self._pending) == self._pending.maxlen:
+                self.dropped_frames += 1
+            self._pending.append(frame)
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self.done:
+                    self._condition.wait()
+                if self.done:
+                    return
+                frame = self._pending.popleft()
+
+            try:
+                t0 = time.perf_counter_ns()
+                self.send(frame)
+                self.sent_frames += 1
+                if self.profiler is not None:
+                    self.profiler.add_since(f"{self.name}.send", t0)
+            except Exception as e:
+                logger.warning("%s: %s", self.name, e)
@@ -0,0 +1,123 @@
+"""Lightweight, always-on timing of the state loop.
+
+Each measured section keeps a rolling window of its durations, from which
+p50/p99/max are computed on demand. Example:
+
+    STATE.profiler.summary()["tick"]["p99_ms"]
+    STATE.profiler.dump("profile.json")
+"""
+import json
+import threading
+import time
+
+import numpy as np
+
+# Number of samples kept for each section, 10 seconds at 60 Hz.
+DEFAULT_WINDOW = 600
+
+NS_PER_MS = 1_000_000
+
+
+class RollingStat:
+    """Durations of the last window samples of one section."""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        """Constructor.
+
+        window (int): Number of samples kept.
+        """
+        self.window = window
+        self.samples = []
+        self.count = 0
+        self.last_ns = 0
+        self._index = 0
+
+    def add(self, duration_ns):
+        if len(self.samples) < self.window:
+            self.samples.append(duration_ns)
+        else:
+            self.samples[self._index] = duration_ns
+            self._index = (self._index + 1) % self.window
+        self.count += 1
+        self.last_ns = duration_ns
+
+    def summary(self):
+        """Return the statistics of the samples in the window, in milliseconds."""
+        samples = np.array(self.samples, dtype=float)
+        if samples.size == 0:
+            return {"count": self.count}
+        p50, p99 = np.percentile(samples, [50, 99])
+        return {
+            "count": self.count,
+            "last_ms": self.last_ns / NS_PER_MS,
+            "p50_ms": float(p50) / NS_PER_MS,
+            "p99_ms": float(p99) / NS_PER_MS,
+            "max_ms": float(samples.max()) / NS_PER_MS,
+        }
+
+
+class TickProfiler:
+    """Collects the durations of named sections of the state loop.
+
+    Section names are dotted, e.g. "tick", "automations", "track.Track 0",
+    "clip.Track 0/Clip 1" or "io.ethernet_dmx(127.0.0.1:6454)".
+    """
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        """Constructor.
+
+        window (int): Number of samples kept for each section.
+        """
+        self.window = window
+        self.enabled = True
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def stat(self, name):
+        stat = self.stats.get(name)
+        if stat is None:
+            with self._lock:
+                stat = self.stats.setdefault(name, RollingStat(self.window))
+        return stat
+
+    def add(self, name, duration_ns):
+        """Record one duration of a section."""
+        if self.enabled:
+            self.stat(name).add(duration_ns)
+
+    def add_since(self, name, t0_ns):
+        """Record the duration of a section that started at t0_ns.
+
+        Returns the current time so that sections can be chained.
+        """
+        t1_ns = time.perf_counter_ns()
+        self.add(name, t1_ns - t0_ns)
+        return t1_ns
+
+    def summary(self, prefix=""):
+        """Return the statistics of every section whose name starts with prefix."""
+        return {
+            name: stat.summary()
+            for name, stat in sorted(self.stats.copy().items())
+            if name.startswith(prefix)
+        }
+
+    def slowest(self, prefix="", n=10, key="p99_ms"):
+        """Return the n (name, statistics) pairs with the highest key."""
+        summary = self.summary(prefix)
+        return sorted(
+            summary.items(), key=lambda item: item[1].get(key, 0), reverse=True
+        )[:n]
+
+    def dump(self, path):
+        """Write the statistics of every section to a JSON file."""
+        with open(path, "w") as f:
+            json.dump(
+                {"time": time.time(), "window": self.window, "sections": self.summary()},
+                f,
+                indent=4,
+            )
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
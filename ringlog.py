@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import namedtuple
+
+DEFAULT_CAPACITY = 1000
+
+DEBUG = "debug"
+INFO = "info"
+WARNING = "warning"
+ERROR = "error"
+
+LogEntry = namedtuple("LogEntry", ["time", "level", "source", "message"])
+
+
+class RingLog:
+    """A log that keeps its last capacity entries.
+
+    Entries are numbered in the order they are appended, which lets a
+    reader only fetch the entries it has not seen yet with entries_since().
+    """
+
+    def __init__(self, source, capacity=DEFAULT_CAPACITY):
+        """Constructor.
+
+        source (str): Where the entries come from, e.g. "osc".
+        capacity (int): Number of entries kept.
+        """
+        self.source = source
+        self.capacity = capacity
+        # Number of entries ever appended, the next entry's position.
+        self.total = 0
+        self._entries = [None] * capacity
+        self._first = 0
+        self._lock = threading.Lock()
+
+    def append(self, message, level=INFO):
+        """Add an entry. Exceptions and other objects are stored as text."""
+        if isinstance(message, BaseException) and level == INFO:
+            level = ERROR
+        entry = LogEntry(time.time(), level, self.source, str(message))
+        with self._lock:
+            self._entries[self.total % self.capacity] = entry
+            self.total += 1
+            self._first = max(self._first, self.total - self.capacity)
+
+    def debug(self, message):
+        self.append(message, DEBUG)
+
+    def info(self, message):
+        self.append(message, INFO)
+
+    def warning(self, message):
+        self.append(message, WARNING)
+
+    def error(self, message):
+        self.append(message, ERROR)
+
+    def clear(self):
+        with self._lock:
+            self._first = self.total
+
+    def entries_since(self, position):
+        """Return the entries appended at or after position, oldest first.
+
+        Also returns the position to pass next time. Entries that have
+        been overwritten or cleared are skipped.
+        """
+        with self._lock:
+            total = self.total
+            start = max(position, self._first)
+            entries = [
+                self._entries[i % self.capacity] for i in range(start, total)
+            ]
+        return entries, total
+
+    def __len__(self):
+        return self.total - self._first
+
+    def __iter__(self):
+        return iter(self.entries_since(0)[0])
+
+    def __getitem__(self, index):
+        return list(self)[index]
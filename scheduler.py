@@ -0,0 +1,102 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+NS_PER_S = 1_000_000_000
+
+DEFAULT_TICK_RATE = 60.0
+
+
+class TickScheduler:
+    """Runs a function at a fixed rate.
+
+    Ticks are scheduled against absolute deadlines on a monotonic clock,
+    so sleep overshoot of one tick does not delay the following ones.
+    The OS sleep is only used until SPIN_NS before a deadline, the rest
+    is spent spinning on the clock for precision.
+    """
+
+    # Time before a deadline that is spent spinning instead of sleeping.
+    SPIN_NS = 1_000_000
+
+    # Lateness, as a fraction of the period, up to which a tick is not
+    # counted as a missed deadline.
+    MISS_TOLERANCE = 0.25
+
+    # Minimum time between two missed deadline reports.
+    REPORT_PERIOD_NS = NS_PER_S
+
+    def __init__(self, rate=DEFAULT_TICK_RATE):
+        """Constructor.
+
+        rate (float): The number of ticks per second.
+        """
+        self.rate = None
+        self.period_ns = None
+        self.set_rate(rate)
+
+        self.ticks = 0
+        self.missed_deadlines = 0
+        self.max_lateness_ns = 0
+
+        self._deadline_ns = None
+        self._unreported_misses = 0
+        self._last_report_ns = 0
+
+    def set_rate(self, rate):
+        if rate <= 0:
+            raise ValueError(f"Invalid tick rate {rate}")
+        self.rate = float(rate)
+        self.period_ns = round(NS_PER_S / self.rate)
+
+    def start(self):
+        """(Re)start the schedule with the first deadline one period from now."""
+        self._deadline_ns = time.perf_counter_ns() + self.period_ns
+
+    def wait(self):
+        """Block until the next deadline.
+
+        If the deadline has already passed, returns immediately and the
+        schedule skips ahead to the next deadline in the future rather
+        than trying to catch up with a burst of ticks.
+        """
+        if self._deadline_ns is None:
+            self.start()
+
+        now = time.perf_counter_ns()
+        lateness = now - self._deadline_ns
+        if lateness > 0:
+            if lateness > self.period_ns * self.MISS_TOLERANCE:
+                self._missed(now, lateness)
+            self._deadline_ns += (lateness // self.period_ns) * self.period_ns
+        else:
+            remaining = -lateness
+            if remaining > self.SPIN_NS:
+                time.sleep((remaining - self.SPIN_NS) / NS_PER_S)
+            while time.perf_counter_ns() < self._deadline_ns:
+                pass
+
+        self._deadline_ns += self.period_ns
+        self.ticks += 1
+
+    def run(self, tick, done=lambda: False):
+        """Call tick() once per period until done() returns True."""
+        self.start()
+        while not done():
+            self.wait()
+            tick()
+
+    def _missed(self, now, lateness):
+        self.missed_deadlines += 1
+        self._unreported_misses += 1
+        self.max_lateness_ns = max(self.max_lateness_ns, lateness)
+        if now - self._last_report_ns >= self.REPORT_PERIOD_NS:
+            logger.warning(
+                "Missed %s tick deadline(s) at %s Hz (late by %.3f ms)",
+                self._unreported_misses,
+                self.rate,
+                lateness / 1e6,
+            )
+            self._unreported_misses = 0
+            self._last_report_ns = now
@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the top of the repository.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import model
+
+
+@pytest.fixture
+def state(tmp_path):
+    """A fresh ProgramState with an empty project folder."""
+    previous = model.STATE
+    model.STATE = model.ProgramState()
+    model.STATE.project_folder_path = str(tmp_path)
+    os.makedirs(tmp_path / "code", exist_ok=True)
+    yield model.STATE
+    model.STATE = previous
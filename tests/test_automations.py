@@ -0,0 +1,76 @@
+import model
+
+
+def playing_inputs(state):
+    clip = state.execute(f"new_clip {state.tracks[0].id},0").payload
+    clip.speed = -1
+    inputs = []
+    for i, dtype in enumerate(["int", "float", "bool"] * 3):
+        input_channel = clip.create_source(dtype)
+        input_channel.speed = i % 3 - 1
+        automation = input_channel.add_automation()
+        automation.add_point(model.Point(0.7 + i * 0.3, 1 - i % 2))
+        inputs.append(input_channel)
+    clip.start()
+    return clip, inputs
+
+
+def test_batch_values_match_single_evaluation(state):
+    clip, inputs = playing_inputs(state)
+    batch = model.AutomationBatch()
+
+    for tick in range(200):
+        beat = tick * 0.0731
+        batch.update(beat, state.tracks)
+        for input_channel in inputs:
+            current_beat = (
+                beat * 2**clip.speed * 2**input_channel.speed
+            ) % input_channel.active_automation.length
+            expected = input_channel.active_automation.value(current_beat)
+            value = input_channel.automation_value(current_beat, batch)
+            assert value == expected
+            assert type(value) is type(expected)
+        assert not batch.dirty
+    assert batch.generation == 1
+
+
+def test_inputs_are_gathered_again_when_they_change(state):
+    clip, inputs = playing_inputs(state)
+    batch = model.AutomationBatch()
+    batch.update(1.0, state.tracks)
+    clip.update(1.0, batch)
+    assert not batch.dirty
+
+    # A new input, and a new function for an existing one.
+    new_input = clip.create_source("int")
+    new_input.add_automation()
+    inputs[0].active_automation.add_point(model.Point(2.5, 3))
+    clip.update(1.0, batch)
+    assert batch.dirty
+
+    batch.update(1.0, state.tracks)
+    assert batch.generation == 2
+    assert len(batch.values) == len(inputs) + 1
+    clip.update(1.0, batch)
+    assert not batch.dirty
+
+
+def test_stopped_clips_are_no_longer_evaluated(state):
+    clip, inputs = playing_inputs(state)
+    batch = model.AutomationBatch()
+    for beat in [1.0, 1.1]:
+        batch.update(beat, state.tracks)
+        clip.update(beat, batch)
+    assert len(batch.values) == len(inputs)
+    assert batch.generation == 1
+
+    clip.stop()
+    for beat in [1.2, 1.3]:
+        batch.update(beat, state.tracks)
+        clip.update(beat, batch)
+    assert batch.values == []
+    assert batch.functions.functions == []
+
+    # Nothing to read while nothing plays, so nothing is gathered again.
+    batch.update(1.4, state.tracks)
+    assert batch.generation == 2
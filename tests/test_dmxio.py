@@ -0,0 +1,62 @@
+import socket
+import struct
+
+import pytest
+
+import dmxio
+
+
+@pytest.fixture
+def receiver():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        sock.bind(("127.0.0.1", dmxio.SACN_PORT))
+    except OSError as e:
+        sock.close()
+        pytest.skip(f"sACN port unavailable: {e}")
+    sock.settimeout(1.0)
+    yield sock
+    sock.close()
+
+
+def test_sacn_packet(receiver):
+    connection = dmxio.SacnConnection("127.0.0.1", priority=150)
+    connection.set_channels(1, [10, 20, 30], universe=2)
+    connection.set_channel(512, 255, universe=2)
+
+    connection.render(2)
+    packet, _ = receiver.recvfrom(1024)
+    assert len(packet) == 638
+    assert packet[4:16] == b"ASC-E1.17\x00\x00\x00"
+    # Flags and length of the root, framing and DMP layers.
+    assert struct.unpack_from("!H", packet, 16)[0] == 0x7000 | (638 - 16)
+    assert struct.unpack_from("!H", packet, 38)[0] == 0x7000 | (638 - 38)
+    assert struct.unpack_from("!H", packet, 115)[0] == 0x7000 | (638 - 115)
+    assert packet[108] == 150
+    # Universe 0 is reserved by E1.31, project universe 2 is sACN universe 3.
+    assert struct.unpack_from("!H", packet, 113)[0] == 3
+    assert packet[111] == 1
+    # Property value count: START code and 512 channels.
+    assert struct.unpack_from("!H", packet, 123)[0] == 513
+    assert packet[125] == 0x00
+    assert packet[126:129] == bytes([10, 20, 30])
+    assert packet[637] == 255
+
+    connection.render(2)
+    packet, _ = receiver.recvfrom(1024)
+    assert packet[111] == 2
+
+
+def test_sacn_changed_only(receiver):
+    connection = dmxio.SacnConnection("127.0.0.1", keep_alive=10)
+    connection.set_channel(1, 1)
+    assert connection.render(0, changed_only=True)
+    receiver.recvfrom(1024)
+    assert not connection.render(0, changed_only=True)
+    connection.set_channel(1, 2)
+    assert connection.render(0, changed_only=True)
+    packet, _ = receiver.recvfrom(1024)
+    assert packet[126] == 2
+    assert packet[111] == 2
+
@@ -0,0 +1,94 @@
+import sys
+import threading
+
+from inputqueue import InputEventQueue
+
+
+def applied(updates):
+    return [(apply.__self__, value) for apply, value in updates]
+
+
+class Sink:
+    def __init__(self):
+        self.values = []
+
+    def apply(self, value):
+        self.values.append(value)
+
+
+def test_latest_value_per_key():
+    queue = InputEventQueue()
+    a, b = Sink(), Sink()
+    for value in range(100):
+        queue.push("a", value, a.apply)
+    queue.push("b", 1, b.apply)
+    queue.push("a", 100, a.apply)
+    assert len(queue) == 2
+
+    updates, triggers, oldest_ns = queue.drain()
+    assert applied(updates) == [(a, 100), (b, 1)]
+    assert triggers == []
+    assert oldest_ns is not None
+    assert queue.coalesced == 100
+    assert queue.coalesced_counts["a"] == 100
+    assert queue.drain() == ([], [], None)
+
+
+def test_triggers_are_not_coalesced():
+    queue = InputEventQueue()
+    queue.push_trigger("midi", ("Pad", 0, 36))
+    queue.push_trigger("midi", ("Pad", 0, 36))
+    _, triggers, _ = queue.drain()
+    assert triggers == [("midi", ("Pad", 0, 36))] * 2
+
+
+def test_full_queue_keeps_latest_values():
+    queue = InputEventQueue(capacity=2)
+    a, b, c = Sink(), Sink(), Sink()
+    queue.push("a", 0, a.apply)
+    queue.push("b", 0, b.apply)
+    queue.push("c", 0, c.apply)
+    # Keys that are already waiting still take their newest value.
+    for value in range(1, 10):
+        queue.push("a", value, a.apply)
+        queue.push("b", value, b.apply)
+
+    updates, _, _ = queue.drain()
+    assert applied(updates) == [(a, 9), (b, 9)]
+    assert queue.dropped == 1
+
+    queue.push("c", 1, c.apply)
+    updates, _, _ = queue.drain()
+    assert applied(updates) == [(c, 1)]
+
+
+def test_last_value_is_never_lost_while_draining():
+    queue = InputEventQueue()
+    sinks = [Sink() for _ in range(4)]
+    n_values = 20000
+    done = threading.Event()
+
+    def produce():
+        for value in range(n_values):
+            for key, sink in enumerate(sinks):
+                queue.push(key, value, sink.apply)
+        done.set()
+
+    # Switch threads often, so that pushes and drains interleave.
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        thread = threading.Thread(target=produce)
+        thread.start()
+        while not done.is_set():
+            for apply, value in queue.drain()[0]:
+                apply(value)
+        thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    for apply, value in queue.drain()[0]:
+        apply(value)
+
+    for sink in sinks:
+        assert sink.values[-1] == n_values - 1
+        assert sink.values == sorted(sink.values)
@@ -0,0 +1,68 @@
+import random
+
+import numpy as np
+import pytest
+import scipy.interpolate
+
+from interpolation import KINDS
+from interpolation import PiecewisePolynomialBatch
+from interpolation import make_interpolator
+
+
+def automations(seed, count=150):
+    """Return random automation points, with integer, fractional and repeated beats."""
+    rng = random.Random(seed)
+    for i in range(count):
+        n = rng.randint(1, 12)
+        xs = [
+            rng.choice([rng.randint(0, 8), round(rng.uniform(0, 8), 2)])
+            for _ in range(n)
+        ]
+        if i % 3 == 0:
+            xs = [0] + xs + [8]
+        ys = [rng.choice([rng.randint(0, 255), rng.uniform(0, 100)]) for _ in xs]
+        points = sorted(set(xs)) + [rng.uniform(-1, 9) for _ in range(50)]
+        yield xs, ys, np.array(points, dtype=float)
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_matches_interp1d(kind):
+    tested = 0
+    for xs, ys, points in automations(seed=KINDS.index(kind)):
+        try:
+            expected_f = scipy.interpolate.interp1d(
+                xs, ys, kind=kind, assume_sorted=False, bounds_error=False
+            )
+        except ValueError:
+            # E.g. too few distinct points for the spline order.
+            continue
+        expected = expected_f(points)
+        f = make_interpolator(xs, ys, kind)
+
+        np.testing.assert_allclose(
+            f(points), expected, rtol=1e-9, atol=1e-9, equal_nan=True
+        )
+        np.testing.assert_allclose(
+            [f(x) for x in points], expected, rtol=1e-9, atol=1e-9, equal_nan=True
+        )
+        tested += 1
+    assert tested > 50
+
+
+def test_batch_matches_single_evaluation():
+    functions = []
+    x = []
+    for kind in KINDS:
+        for xs, ys, points in automations(seed=100 + KINDS.index(kind), count=30):
+            try:
+                f = make_interpolator(xs, ys, kind)
+            except ValueError:
+                continue
+            # Evaluate each function at each of its points, in one batch.
+            functions.extend([f] * len(points))
+            x.extend(points)
+
+    batch = PiecewisePolynomialBatch()
+    batch.set_functions(functions)
+    expected = [f(value) for f, value in zip(functions, x)]
+    np.testing.assert_array_equal(batch.evaluate(np.array(x)), expected)
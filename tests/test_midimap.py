@@ -0,0 +1,32 @@
+import pytest
+
+import model
+
+
+def test_channel_map_is_read_only(state):
+    device = model.MidiInputDevice("Test Input")
+    midi_input = model.MidiInput(name="Fader")
+    device.map_channel(1, 7, midi_input)
+
+    channel_map = device.channel_map
+    assert channel_map[1][7] == (midi_input,)
+    with pytest.raises(TypeError):
+        channel_map[2] = {}
+    with pytest.raises(TypeError):
+        channel_map[1][8] = [midi_input]
+
+    model.global_unmap_midi(midi_input)
+    assert not device.channel_map
+    assert channel_map[1][7] == (midi_input,)
+
+
+def test_unmap_output_from_every_key(state):
+    device = model.MidiOutputDevice("Test Output")
+    output = model.SourceNode(name="Pad")
+    device.map_channel(0, 36, output)
+    device.map_sysex("F0 00 vv F7", output)
+    assert model.MIDI_OUTPUT_MAP[output] == {device}
+
+    model.global_unmap_midi(output)
+    assert device.channel_map == {}
+    assert output not in model.MIDI_OUTPUT_MAP
@@ -0,0 +1,99 @@
+import random
+
+import mido
+import pytest
+
+import midisync
+
+CLOCK = mido.Message("clock")
+
+
+def run_clock(sync, bpm, start_t, seconds, jitter_s, seed=1):
+    """Send a jittered MIDI clock and sample the beat at 60 Hz.
+
+    Returns the largest phase error in seconds once locked and the number
+    of times the beat went backwards.
+    """
+    rng = random.Random(seed)
+    period = 60.0 / (bpm * midisync.PULSES_PER_BEAT)
+    pulses = int(seconds / period)
+    lock_pulses = 10 * midisync.PULSES_PER_BEAT * 8
+    tick_t = start_t
+    max_error = 0.0
+    backwards = 0
+    previous = None
+    for n in range(pulses):
+        sync.receive(CLOCK, start_t + n * period + rng.gauss(0, jitter_s))
+        next_t = start_t + (n + 1) * period
+        while tick_t < next_t:
+            beat = sync.beat(tick_t, 120.0)
+            if n > lock_pulses:
+                expected = (tick_t - start_t) / (period * midisync.PULSES_PER_BEAT)
+                max_error = max(max_error, abs(beat - expected) * 60.0 / bpm)
+            if previous is not None and beat < previous:
+                backwards += 1
+            previous = beat
+            tick_t += 1 / 60
+    return max_error, backwards
+
+
+def test_clock_follows_two_hour_set():
+    sync = midisync.MidiClockSync()
+    sync.receive(mido.Message("start"), 99.99)
+    max_error, backwards = run_clock(
+        sync, bpm=128.0, start_t=100.0, seconds=2 * 3600, jitter_s=0.001
+    )
+    # 1 ms of jitter, the beat stays within a few ms and never goes back.
+    assert max_error < 0.003
+    assert backwards == 0
+    assert sync.tempo(0) == pytest.approx(128.0, abs=0.1)
+
+
+def test_clock_tempo_change():
+    sync = midisync.MidiClockSync()
+    sync.receive(mido.Message("start"), 0.0)
+    run_clock(sync, bpm=120.0, start_t=0.0, seconds=30, jitter_s=0.0005)
+    assert sync.tempo(0) == pytest.approx(120.0, abs=0.1)
+
+
+def test_stop_song_position_continue():
+    sync = midisync.MidiClockSync()
+    sync.receive(mido.Message("start"), 0.0)
+    period = 60.0 / (120.0 * midisync.PULSES_PER_BEAT)
+    for n in range(48):
+        sync.receive(CLOCK, n * period)
+    t = 48 * period
+    sync.receive(mido.Message("stop"), t)
+    held = sync.beat(t, 120.0)
+    assert held == pytest.approx(2.0, abs=0.05)
+    assert sync.beat(t + 0.5, 120.0) == held
+
+    # 16 sixteenths is beat 4.
+    sync.receive(mido.Message("songpos", pos=16), t + 1)
+    sync.receive(mido.Message("continue"), t + 1)
+    sync.receive(CLOCK, t + 1 + period)
+    assert sync.beat(t + 1 + period, 120.0) == pytest.approx(4.0)
+
+
+def test_mtc():
+    sync = midisync.MidiClockSync()
+    rng = random.Random(1)
+    start_t = 10.0
+    rate = 25
+
+    def pieces(frame):
+        # 01:mm:ss:ff at 25 fps.
+        f = frame % rate
+        s = (frame // rate) % 60
+        m = (frame // (rate * 60)) % 60
+        return [f & 15, f >> 4, s & 15, s >> 4, m & 15, m >> 4, 1, 1 << 1]
+
+    for frame in range(0, 400, 2):
+        for i, value in enumerate(pieces(frame)):
+            sync.receive(
+                mido.Message("quarter_frame", frame_type=i, frame_value=value),
+                start_t + (frame + i / 4) / rate + rng.gauss(0, 0.0005),
+            )
+    t = start_t + 400 / rate - 0.01
+    # At 60 bpm a beat is a second.
+    assert sync.beat(t, 60.0) == pytest.approx(3600 + 400 / rate - 0.01, abs=0.005)
@@ -0,0 +1,129 @@
+import time
+
+import pytest
+from pythonosc import osc_bundle_builder
+from pythonosc import osc_message_builder
+from pythonosc import udp_client
+
+import model
+
+
+class FakeInput:
+    def __init__(self):
+        self.values = []
+
+    def ext_set(self, value):
+        self.values.append(value)
+
+
+@pytest.fixture
+def server(state):
+    server = model.OscServerInput("0")
+    assert server.connected()
+    yield server
+    server.server.stop()
+
+
+@pytest.fixture
+def client(server):
+    return udp_client.SimpleUDPClient("127.0.0.1", server.server.server_address()[1])
+
+
+def process(state, server, packets, timeout=2.0):
+    """Wait for the server to receive a number of packets and apply them."""
+    end = time.monotonic() + timeout
+    while server.server.received < packets and time.monotonic() < end:
+        time.sleep(0.001)
+    state.process_input_events()
+
+
+def bundle(timetag, messages):
+    builder = osc_bundle_builder.OscBundleBuilder(timetag)
+    for address, value in messages:
+        message = osc_message_builder.OscMessageBuilder(address)
+        message.add_arg(value)
+        builder.add_content(message.build())
+    return builder.build()
+
+
+def test_message(state, server, client):
+    fader = FakeInput()
+    server.map_channel("/fader/1", fader)
+    client.send_message("/fader/1", 0.5)
+    process(state, server, 1)
+    assert fader.values == [0.5]
+
+
+def test_wildcard_message(state, server, client):
+    faders = [FakeInput() for _ in range(3)]
+    other = FakeInput()
+    for i, fader in enumerate(faders):
+        server.map_channel(f"/fader/{i + 1}", fader)
+    server.map_channel("/other/1", other)
+
+    client.send_message("/fader/*", 0.25)
+    client.send_message("/fader/{1,3}", 0.75)
+    process(state, server, 2)
+    assert [fader.values for fader in faders] == [[0.25, 0.75], [0.25], [0.25, 0.75]]
+    assert other.values == []
+
+
+def test_wildcard_mapping(state, server, client):
+    bank = [FakeInput() for _ in range(4)]
+    server.map_channels("/bank*/fader/*", bank)
+    pattern_input = FakeInput()
+    server.map_channel("/pad/*", pattern_input)
+
+    client.send_message("/bank1/fader/3", 0.5)
+    client.send_message("/bank2/fader/x", 1.0)
+    client.send_message("/pad/7", 1.0)
+    process(state, server, 3)
+    assert [fader.values for fader in bank] == [[], [], [0.5], []]
+    assert pattern_input.values == [1.0]
+
+    # Incoming patterns address the inputs of an array they match.
+    client.send_message("/bank1/fader/[1-2]", 0.25)
+    process(state, server, 4)
+    assert [fader.values for fader in bank] == [[0.25], [0.25], [0.5], []]
+
+
+def test_bundle(state, server, client):
+    a = FakeInput()
+    b = FakeInput()
+    server.map_channel("/a", a)
+    server.map_channel("/b", b)
+
+    # The messages of a bundle are not coalesced and arrive on one tick.
+    client.send(
+        bundle(osc_bundle_builder.IMMEDIATELY, [("/a", 1), ("/b", 2), ("/a", 3)])
+    )
+    process(state, server, 1)
+    assert a.values == [1, 3]
+    assert b.values == [2]
+
+
+def test_bundle_timetag(state, server, client):
+    a = FakeInput()
+    server.map_channel("/a", a)
+
+    client.send(bundle(time.time() + 0.2, [("/a", 1)]))
+    process(state, server, 1)
+    assert a.values == []
+    time.sleep(0.25)
+    state.process_input_events()
+    assert a.values == [1]
+
+
+def test_map_osc_array_command(state, server, client):
+    state.io_inputs[0] = server
+    bank = [model.OscInput(dtype="float") for _ in range(2)]
+    ids = ",".join(input_channel.id for input_channel in bank)
+    assert state.execute(f"map_osc_array /fader/* 1 {ids}").success
+    assert not state.execute(f"map_osc_array /fader/1 1 {ids}").success
+
+    client.send_message("/fader/2", 0.5)
+    process(state, server, 1)
+    assert bank[1].ext_get() == 0.5
+
+    assert state.execute("unmap_osc_array /fader/*").success
+    assert server.routes_for("/fader/2") == ()
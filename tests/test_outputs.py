@@ -0,0 +1,108 @@
+import pytest
+
+import model
+
+
+def test_group_and_single_outputs_convert_alike():
+    values = [-3, 0.4, 1.5, 2.6, 254.9, 300]
+    group = model.DmxOutputGroup([f"c{i}" for i in range(len(values))], 1)
+    group.values[:] = values
+    singles = []
+    for i, value in enumerate(values):
+        output = model.DmxOutput(dmx_address=100 + i)
+        output.set(value)
+        singles.append(output)
+
+    channel_values = model.dmx_channel_values([group] + singles)
+    assert list(channel_values[0][2]) == [value for _, _, value in channel_values[1:]]
+    assert list(channel_values[0][2]) == [0, 0, 1, 2, 254, 255]
+
+
+def test_group_array_is_shared():
+    strips = [model.DmxOutputGroup(["r", "g", "b"], 1 + i * 3) for i in range(3)]
+    first = model.CodeEditorGroupArray(*strips)
+    first.values[1] = 20
+    # E.g. the init code of another clip, or of the same clip again.
+    second = model.CodeEditorGroupArray(*strips)
+    second.values[2] = 30
+
+    assert first.values is second.values
+    assert list(strips[1].values) == [20] * 3
+    assert list(strips[2].values) == [30] * 3
+
+
+def test_group_array_conflicts():
+    strips = [model.DmxOutputGroup(["r", "g", "b"], 1 + i * 3) for i in range(3)]
+    model.CodeEditorGroupArray(strips[0], strips[1])
+
+    with pytest.raises(model.CodeEditorException):
+        model.CodeEditorGroupArray(strips[1], strips[2])
+    with pytest.raises(model.CodeEditorException):
+        model.CodeEditorGroupArray(strips[1], strips[0])
+    with pytest.raises(model.CodeEditorException):
+        model.CodeEditorGroupArray(strips[2], strips[2])
+    with pytest.raises(model.CodeEditorException):
+        model.CodeEditorGroupArray()
+
+
+def test_create_output_group_universe(state):
+    track = state.tracks[0]
+    group = state.execute(f"create_output_group {track.id} 10 Strip r,g,b 3").payload
+    assert group.universe == 3
+    assert [output.universe for output in group.outputs] == [3, 3, 3]
+    assert [output.dmx_address for output in group.outputs] == [10, 11, 12]
+
+    group = state.execute(f"create_output_group {track.id} 1 Par r,g,b").payload
+    assert group.universe == 0
+    assert group.channel_names == ["r", "g", "b"]
+
+    # Fixture names have spaces.
+    name = "ADJ Pocket Pro (13 Ch. Mode)"
+    group = state.execute(f"create_output_group {track.id} 20 {name} r,g,b 2").payload
+    assert group.name == name
+    assert group.universe == 2
+    assert group.channel_names == ["r", "g", "b"]
+
+    group = state.execute(f"create_output_group {track.id} 30 {name} r,g,b").payload
+    assert group.name == name
+    assert group.universe == 0
+
+
+def test_init_code_can_regroup(state):
+    track = state.tracks[0]
+    for i in range(3):
+        state.execute(f"create_output_group {track.id} {1 + i * 3} Strip{i} r,g,b")
+    clip = state.execute(f"new_clip {track.id},0").payload
+    other_clip = state.execute(f"new_clip {track.id},1").payload
+    strips = track.outputs[-3:]
+
+    clip.init_code.save("Strips = GroupArray(Strip0, Strip1)\n")
+    clip.start()
+    assert clip.playing
+    strips[0].values[:] = 7
+
+    # The init code is edited and runs again.
+    clip.stop()
+    clip.init_code.save("Strips = GroupArray(Strip1, Strip2, Strip0)\n")
+    clip.start()
+    assert clip.playing
+    assert strips[0].group_array[0] == (strips[1], strips[2], strips[0])
+    assert list(strips[0].values) == [7, 7, 7]
+
+    # Another clip can share the same array, but not regroup it.
+    other_clip.init_code.save("Strips = GroupArray(Strip1, Strip2, Strip0)\n")
+    other_clip.start()
+    assert other_clip.playing
+    clip.stop()
+    clip.init_code.save("Strips = GroupArray(Strip0, Strip1)\n")
+    clip.start()
+    assert "Strips" not in clip._context
+    assert strips[0].group_array[0] == (strips[1], strips[2], strips[0])
+
+    # Once the other clip lets go of it, the groups are free again.
+    state.execute(f"delete_clip {track.id},1")
+    clip.stop()
+    clip.start()
+    assert "Strips" in clip._context
+    assert strips[2].group_array is None
+    assert strips[0].group_array[0] == (strips[0], strips[1])